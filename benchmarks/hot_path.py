@@ -0,0 +1,222 @@
+"""Wall time, allocations and payload size of the figure builders and callbacks.
+
+    python -m benchmarks.hot_path --scales 1 10 100
+    python -m benchmarks.hot_path --scales 1 10 100 1000 --save
+    python -m benchmarks.hot_path --scales 1000 --cases update_figures
+
+Every case is run for each year of the dataset and each continent subset,
+with the figure caches disabled so each call does the full work. The scaled
+datasets sample fewer years (see YEAR_STEPS, or pass --year-step). The years
+are timed --repeat times and the fastest pass's median and p95 are reported.
+A further pass over at most ALLOC_YEARS of those years, under tracemalloc,
+records the peak memory allocated per call. Results are compared with
+benchmarks/baselines.json, and the exit status is 1 when a case is slower
+than --threshold times its baseline or its payload grew. Payloads are only
+compared when both runs sampled the same years. --save writes the current
+results as the new baselines.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+from plotly.io.json import to_json_plotly
+
+import dashboard
+import dataset
+from benchmarks.synthetic import SOURCE_CSV, write_scaled_csv
+import figures
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Every n-th year is benchmarked at each scale, so a full run stays in minutes.
+YEAR_STEPS = {1: 1, 10: 3, 100: 10, 1000: 30}
+ALLOC_YEARS = 12
+
+def previous_year(year):
+    years = dataset.get_dataset().years
+    return years[years.index(year) - 1]
+
+def update_figures_full(year, continents):
+    return dashboard.update_figures({"year": year, "continents": continents})
+
+def update_figures_patch(year, continents):
+    # The graphs show the previous year, as after an animation tick.
+    rendered = dashboard.rendered_state(previous_year(year), continents)
+    return dashboard.update_figures({"year": year, "continents": continents}, rendered)
+
+def range_summary(year, continents):
+    # The range from the first year to `year`, as while dragging the upper handle.
+    return dashboard.build_range_figure(dataset.get_dataset().years[0], year, continents)
+
+def country_history(year, continents):
+    # A click on the top mortality bar.
+    country = dataset.get_dataset().top_n(year, continents, "Mortality Rate", 1)["Country"].iloc[0]
+    return dashboard.build_country_figure(country)
+
+def figure_builder(name):
+    # Graph objects under the "plotly" encoding, the plain dicts otherwise,
+    # as dashboard.build_figures builds them.
+    def build(year, continents):
+        if name == "density_contour":
+            figure = figures.create_density_contour_dict(year, continents)
+        else:
+            figure = figures.create_bar_dict(name, year, continents)
+        return figures.figure_object(name, figure) if figures.figure_encoding == "plotly" else figure
+    return build
+
+CASES = {
+    "density_contour": figure_builder("density_contour"),
+    "mortality_bar": figure_builder("mortality_bar"),
+    "oil_bar": figure_builder("oil_bar"),
+    "gdp_bar": figure_builder("gdp_bar"),
+    "update_figures": update_figures_full,
+    "update_figures_patch": update_figures_patch,
+    "range_summary": range_summary,
+    "country_history": country_history,
+}
+
+def continent_subsets(continents):
+    return {
+        "all": list(continents),
+        "one": continents[:1],
+        "three": continents[::2][:3],
+    }
+
+def payload_bytes(result):
+    # What Dash sends: a figure or a figure delta, encoded with Plotly's JSON encoder.
+    return len(to_json_plotly(result))
+
+def percentile(timings, fraction):
+    # Nearest rank of sorted timings: with few calls, such as the two years
+    # sampled at x1000, p95 is the slowest call rather than the fastest.
+    return timings[math.ceil(fraction * len(timings)) - 1]
+
+def run_case(build, years, continents, repeat=1):
+    # Noise on a shared machine only ever adds time, so the fastest of
+    # several passes is the steadiest figure to compare.
+    passes = []
+    for _ in range(repeat):
+        timings = []
+        for year in years:
+            start = time.perf_counter()
+            result = build(year, continents)
+            timings.append(time.perf_counter() - start)
+        passes.append(sorted(timings))
+    size = payload_bytes(result)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for year in years[::-(-len(years) // ALLOC_YEARS)]:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            build(year, continents)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": len(years),
+        "repeats": repeat,
+        "median_ms": round(min(statistics.median(timings) for timings in passes) * 1000, 3),
+        "p95_ms": round(min(percentile(timings, 0.95) for timings in passes) * 1000, 3),
+        "peak_alloc_kb": round(max(peaks) / 1024, 1),
+        "last_year": years[-1],
+        "last_year_bytes": size,
+    }
+
+def run_scale(scale, year_step=None, cases=None, repeat=1):
+    path = write_scaled_csv(scale) if scale > 1 else SOURCE_CSV
+    dataset.set_data_path(path)
+    data = dataset.get_dataset()
+    # Skip the first year, which has no previous year to patch from.
+    year_step = year_step or YEAR_STEPS.get(scale, 1)
+    years = data.years[1::year_step]
+
+    results = {}
+    for case in cases or CASES:
+        for subset, continents in continent_subsets(data.continents).items():
+            result = run_case(CASES[case], years, continents, repeat)
+            results[f"x{scale}/{case}/{subset}"] = {"year_step": year_step, **result}
+    return results
+
+def compare(results, baselines, threshold):
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        ratio = result["median_ms"] / baseline["median_ms"]
+        if ratio > threshold:
+            regressions.append(f"{name}: {baseline['median_ms']} -> {result['median_ms']} ms ({ratio:.2f}x)")
+        # The payload is that of the last sampled year, so it is only
+        # comparable when both runs sampled the same years.
+        same_years = all(result.get(key) == baseline.get(key) for key in ("year_step", "last_year"))
+        if same_years and result["last_year_bytes"] > baseline["last_year_bytes"]:
+            regressions.append(
+                f"{name}: payload {baseline['last_year_bytes']} -> {result['last_year_bytes']} bytes"
+            )
+    return regressions
+
+def load_baselines():
+    if not os.path.exists(BASELINES_PATH):
+        return {}
+    with open(BASELINES_PATH) as f:
+        return json.load(f)["results"]
+
+def save_baselines(results):
+    baselines = {**load_baselines(), **results}
+    with open(BASELINES_PATH, "w") as f:
+        json.dump({
+            "machine": {"python": platform.python_version(), "platform": platform.platform()},
+            "results": dict(sorted(baselines.items())),
+        }, f, indent=1)
+        f.write("\n")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--year-step", type=int,
+                        help="benchmark every n-th year (default depends on the scale)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="passes over the years per case; the fastest pass counts")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown against the baseline that counts as a regression")
+    parser.add_argument("--save", action="store_true", help="store the results as baselines")
+    args = parser.parse_args(argv)
+
+    # Measure the builders, not the caches in front of them.
+    dashboard.configure({"FIGURE_CACHE_SIZE": 0, "FIGURE_STORE": "none"})
+
+    baselines = load_baselines()
+    results = {}
+    print(f"{'case':>40} {'median ms':>10} {'p95 ms':>9} {'peak KB':>9} {'bytes':>9} {'vs base':>8}")
+    for scale in args.scales:
+        for name, result in run_scale(scale, args.year_step, args.cases, args.repeat).items():
+            results[name] = result
+            baseline = baselines.get(name)
+            ratio = f"{result['median_ms'] / baseline['median_ms']:.2f}x" if baseline else "-"
+            print(
+                f"{name:>40} {result['median_ms']:>10.2f} {result['p95_ms']:>9.2f} "
+                f"{result['peak_alloc_kb']:>9.1f} {result['last_year_bytes']:>9} {ratio:>8}"
+            )
+
+    if args.save:
+        save_baselines(results)
+        print(f"Saved {len(results)} baselines to {BASELINES_PATH}")
+        return 0
+
+    regressions = compare(results, baselines, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
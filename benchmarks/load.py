@@ -0,0 +1,304 @@
+"""Concurrent Play sessions against the Dash callback endpoint.
+
+    python -m benchmarks.load --sessions 20 --duration 30
+    python -m benchmarks.load --sessions 50 --gunicorn-workers 4
+    python -m benchmarks.load --sessions 50 --url http://127.0.0.1:8050 --server-pid 1234
+
+Each session presses Play (the `toggle` callback) and then posts one
+`update_figures` request to /_dash-update-component every --interval ms. Like
+the browser, it steps to the next year of the `years` store in the layout and
+sends the requested state with a per-session client id and sequence number,
+plus the rendered state from the previous response's delta. Each session starts with
+a random continent selection and changes it on a --reselect fraction of
+ticks.
+
+By default the requests go through the Flask test client of an in-process app,
+so nothing touches the network. --gunicorn-workers starts gunicorn with
+gunicorn.conf.py on a local port, and --url targets a server that is already
+running. Reports throughput, p50/p95/p99 latency per callback, the share of
+ticks that took longer than the interval, and server CPU per request. A
+request that fails or times out is counted, reported in the error rate and
+left out of the latencies, and its session carries on with the next tick. CPU is
+read from /proc for the process tree of the server, so it is Linux only and
+needs --server-pid with --url. In-process, the figure is the whole process and
+includes the client side.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+from benchmarks.worker_memory import free_port, process_tree, wait_until_ready
+
+CONTINENTS = ["Asia", "Europe", "Africa", "North America", "South America", "Oceania"]
+
+def update_figures_body(requested, rendered):
+    return {
+        "output": "figure-delta.data",
+        "outputs": {"id": "figure-delta", "property": "data"},
+        "inputs": [{"id": "requested-state", "property": "data", "value": requested}],
+        "changedPropIds": ["requested-state.data"],
+        "state": [{"id": "rendered-state", "property": "data", "value": rendered}],
+    }
+
+def toggle_body(n_clicks, disabled):
+    return {
+        "output": "animate.disabled",
+        "outputs": {"id": "animate", "property": "disabled"},
+        "inputs": [{"id": "play", "property": "n_clicks", "value": n_clicks}],
+        "changedPropIds": ["play.n_clicks"],
+        "state": [{"id": "animate", "property": "disabled", "value": disabled}],
+    }
+
+def find_store(layout, store_id):
+    # The `data` of a dcc.Store anywhere in a /_dash-layout response.
+    if isinstance(layout, dict):
+        props = layout.get("props", {})
+        if props.get("id") == store_id:
+            return props.get("data")
+        layout = list(props.values())
+    if isinstance(layout, list):
+        for child in layout:
+            found = find_store(child, store_id)
+            if found is not None:
+                return found
+    return None
+
+class RequestError(Exception):
+    """A callback request answered with an error status."""
+
+def is_timeout(error):
+    # urlopen raises a timeout on connect wrapped in a URLError.
+    return isinstance(error, TimeoutError) or isinstance(getattr(error, "reason", None), TimeoutError)
+
+def random_selection(rng):
+    return sorted(rng.sample(CONTINENTS, rng.randint(1, len(CONTINENTS))), key=CONTINENTS.index)
+
+class InProcessClient:
+    def __init__(self):
+        import dashboard
+        self.app = dashboard.create_app()
+
+    def layout(self):
+        return self.app.server.test_client().get("/_dash-layout").get_json()
+
+    def post(self, body):
+        # A test client per call: they are cheap and not meant to be shared
+        # between threads.
+        response = self.app.server.test_client().post("/_dash-update-component", json=body)
+        if response.status_code == 204:
+            # PreventUpdate: nothing to apply.
+            return None
+        if response.status_code != 200:
+            raise RequestError(f"callback failed with {response.status_code}")
+        return response.get_json()
+
+class HttpClient:
+    def __init__(self, url, timeout=60):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def layout(self):
+        with urlopen(self.url + "/_dash-layout", timeout=60) as response:
+            return json.loads(response.read())
+
+    def post(self, body):
+        request = Request(
+            self.url + "/_dash-update-component", data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read()) if response.status != 204 else None
+        except HTTPError as error:
+            raise RequestError(f"callback failed with {error.code}") from error
+
+def cpu_seconds(pid):
+    # utime + stime of every process in the tree, from /proc/<pid>/stat.
+    ticks = 0
+    for process in process_tree(pid):
+        try:
+            with open(f"/proc/{process}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except FileNotFoundError:
+            continue
+        ticks += int(fields[11]) + int(fields[12])
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+def timed_post(client, body, name, local, failures):
+    """The response to one request, or None when it failed, timed into
+    `local` only when it succeeded."""
+    start = time.perf_counter()
+    try:
+        response = client.post(body)
+    except (RequestError, OSError, ValueError) as error:
+        # Under overload requests fail; counting them, rather than ending
+        # the session, keeps its other latencies in the results.
+        failures["timeouts" if is_timeout(error) else "errors"] += 1
+        return None
+    local[name].append(time.perf_counter() - start)
+    return response
+
+def run_session(client, years, rendered, seed, interval, reselect, deadline, latencies, failures, lock):
+    rng = random.Random(seed)
+    continents = random_selection(rng)
+    year = rendered["year"]
+    local = {"toggle": [], "update_figures": []}
+    local_failures = {"errors": 0, "timeouts": 0}
+
+    timed_post(client, toggle_body(1, True), "toggle", local, local_failures)
+
+    # Sessions start spread over one interval, as real page loads would be.
+    next_tick = time.perf_counter() + rng.uniform(0, interval)
+    n = 0
+    while True:
+        time.sleep(max(0.0, next_tick - time.perf_counter()))
+        if time.perf_counter() >= deadline:
+            break
+        n += 1
+        if rng.random() < reselect:
+            continents = random_selection(rng)
+        year = years[(years.index(year) + 1) % len(years)]
+        requested = {"year": year, "continents": continents, "client": f"session-{seed}", "seq": n}
+
+        response = timed_post(client, update_figures_body(requested, rendered), "update_figures", local, local_failures)
+        if response is not None:
+            # The browser stores the delta's state once it has applied it.
+            rendered = response["response"]["figure-delta"]["data"]["state"]
+        # dcc.Interval keeps its period, so a slow tick delays the next one
+        # but does not skip it.
+        next_tick += interval
+
+    with lock:
+        for name, values in local.items():
+            latencies[name] += values
+        for kind, count in local_failures.items():
+            failures[kind] += count
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+def run(client, sessions, duration, interval, reselect, server_pid, seed=0):
+    latencies = {"toggle": [], "update_figures": []}
+    failures = {"errors": 0, "timeouts": 0}
+    lock = threading.Lock()
+    layout = client.layout()
+    years = find_store(layout, "years")
+    # What the graphs show on page load, including the data version the
+    # server checks before sending a delta against it.
+    rendered = find_store(layout, "rendered-state")
+    cpu_start = cpu_seconds(server_pid)
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [
+        threading.Thread(
+            target=run_session,
+            args=(client, years, rendered, seed + i, interval, reselect, deadline, latencies, failures, lock),
+            daemon=True,
+        )
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = cpu_seconds(server_pid) - cpu_start
+
+    succeeded = sum(len(values) for values in latencies.values())
+    failed = failures["errors"] + failures["timeouts"]
+    requests = succeeded + failed
+    return {
+        "sessions": sessions,
+        "elapsed_s": elapsed,
+        "requests": requests,
+        "errors": failures["errors"],
+        "timeouts": failures["timeouts"],
+        "error_rate": failed / requests if requests else 0.0,
+        "throughput_rps": succeeded / elapsed,
+        "cpu_ms_per_request": cpu * 1000 / requests if requests else 0.0,
+        "late_ticks": sum(latency > interval for latency in latencies["update_figures"]),
+        "latency_ms": {
+            name: {
+                "count": len(values),
+                "p50": percentile(values, 50) * 1000,
+                "p95": percentile(values, 95) * 1000,
+                "p99": percentile(values, 99) * 1000,
+            }
+            for name, values in latencies.items() if values
+        },
+    }
+
+def start_gunicorn(workers):
+    port = free_port()
+    env = {**os.environ, "GUNICORN_WORKERS": str(workers), "GUNICORN_BIND": f"127.0.0.1:{port}"}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    wait_until_ready(url + "/_dash-layout")
+    return server, url
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--interval", type=int, default=3000,
+                        help="ms between ticks, the dcc.Interval period of the layout")
+    parser.add_argument("--reselect", type=float, default=0.1,
+                        help="fraction of ticks on which a session changes its continent selection")
+    parser.add_argument("--seed", type=int, default=0)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="a running server, e.g. http://127.0.0.1:8050")
+    target.add_argument("--gunicorn-workers", type=int, help="start gunicorn with this many workers")
+    parser.add_argument("--server-pid", type=int, help="process (tree) to charge CPU to with --url")
+    parser.add_argument("--timeout", type=float, default=60,
+                        help="seconds before an HTTP request counts as timed out")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args(argv)
+
+    server = None
+    if args.gunicorn_workers:
+        server, url = start_gunicorn(args.gunicorn_workers)
+        client, server_pid = HttpClient(url, args.timeout), server.pid
+    elif args.url:
+        if args.server_pid is None:
+            parser.error("--url needs --server-pid to measure server CPU")
+        client, server_pid = HttpClient(args.url, args.timeout), args.server_pid
+    else:
+        client, server_pid = InProcessClient(), os.getpid()
+
+    try:
+        result = run(client, args.sessions, args.duration, args.interval / 1000, args.reselect,
+                     server_pid, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.json:
+        print(json.dumps(result, indent=1))
+        return
+    print(
+        f"{result['sessions']} sessions, {result['requests']} requests in {result['elapsed_s']:.1f} s: "
+        f"{result['throughput_rps']:.1f} req/s, {result['cpu_ms_per_request']:.1f} ms CPU per request, "
+        f"{result['late_ticks']} ticks slower than the interval"
+    )
+    print(
+        f"{result['errors']} errors, {result['timeouts']} timeouts: "
+        f"{result['error_rate']:.1%} of requests failed"
+    )
+    print(f"{'callback':>15} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, stats in result["latency_ms"].items():
+        print(f"{name:>15} {stats['count']:>6} {stats['p50']:>8.1f} {stats['p95']:>8.1f} {stats['p99']:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Build and encode time, and bytes, of update_figures responses per figure encoding.
+
+    python -m benchmarks.serialization
+    python -m benchmarks.serialization --scale 100 --year-step 5
+
+For each FIGURE_ENCODING (plotly, dict) and each JSON engine Plotly
+can use (json, and orjson when installed), every year is rendered for all
+continents with the figure caches turned off. Reports the median time to
+build the three figures, the median time to encode the update_figures
+response the way Dash does, and the size of a full response and of a delta
+response from the previous year.
+"""
+import argparse
+import statistics
+import time
+
+import plotly.io as pio
+from plotly.io.json import to_json_plotly
+
+import dashboard
+import dataset
+import figures
+from benchmarks.synthetic import SOURCE_CSV, write_scaled_csv
+
+ENCODINGS = ["plotly", "dict"]
+
+def engines():
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        return ["json"]
+    return ["json", "orjson"]
+
+def dash_response(delta):
+    # The body Dash encodes for the update_figures callback.
+    return {"multi": True, "response": {"figure-delta": {"data": delta}}}
+
+def encode(response):
+    return to_json_plotly(response)
+
+def measure(encoding, engine, years, continents):
+    figures.figure_encoding = encoding
+    pio.json.config.default_engine = engine
+
+    build_times, encode_times, full_bytes, patch_bytes = [], [], [], []
+    for previous, year in zip(years, years[1:]):
+        start = time.perf_counter()
+        dashboard.build_figures(year, continents)
+        build_times.append(time.perf_counter() - start)
+
+        requested = {"year": year, "continents": continents}
+        full = dash_response(dashboard.update_figures(requested))
+        start = time.perf_counter()
+        body = encode(full)
+        encode_times.append(time.perf_counter() - start)
+        full_bytes.append(len(body))
+
+        rendered = dashboard.rendered_state(previous, continents)
+        patch = dash_response(dashboard.update_figures(requested, rendered))
+        patch_bytes.append(len(encode(patch)))
+
+    return {
+        "build_ms": statistics.median(build_times) * 1000,
+        "encode_ms": statistics.median(encode_times) * 1000,
+        "full_kb": statistics.mean(full_bytes) / 1024,
+        "patch_kb": statistics.mean(patch_bytes) / 1024,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", type=int, default=1)
+    parser.add_argument("--year-step", type=int, default=1)
+    parser.add_argument("--density-grid-size", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    dashboard.configure({
+        "DATA_PATH": write_scaled_csv(args.scale) if args.scale > 1 else SOURCE_CSV,
+        "DENSITY_GRID_SIZE": args.density_grid_size,
+        "FIGURE_CACHE_SIZE": 0,
+        "FIGURE_STORE": "none",
+    })
+
+    data = dataset.get_dataset()
+    years = data.years[::args.year_step]
+    print(f"{'encoding':>8} {'engine':>7} {'build ms':>9} {'encode ms':>10} {'full KB':>8} {'patch KB':>9}")
+    for encoding in ENCODINGS:
+        for engine in engines():
+            result = measure(encoding, engine, years, data.continents)
+            print(
+                f"{encoding:>8} {engine:>7} {result['build_ms']:>9.1f} {result['encode_ms']:>10.2f} "
+                f"{result['full_kb']:>8.1f} {result['patch_kb']:>9.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+SOURCE_CSV = "oil_consumption_mortality.csv"
+
+# Scaled datasets are written once and reused by every later run.
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+
+def scale_dataset(df, factor, seed=0):
+    """Replicate every country `factor` times with jittered metric values.
+
+    Copies get a " #i" suffix, so the years, continents and per-year group
+    structure stay the same and only the row count grows.
+    """
+    if factor <= 1:
+        return df.copy()
+    rng = np.random.default_rng(seed)
+    scaled = df.iloc[np.tile(np.arange(len(df)), factor)].reset_index(drop=True)
+    suffixes = np.repeat([""] + [f" #{i}" for i in range(1, factor)], len(df))
+    scaled["Country"] = scaled["Country"].astype(str) + suffixes
+
+    jitter = rng.uniform(0.8, 1.2, size=(len(scaled), 3))
+    jitter[: len(df)] = 1
+    scaled["Mortality Rate"] = (scaled["Mortality Rate"] * jitter[:, 0]).round(1)
+    scaled["Oil Consumption per capita (tonnes per year)"] = (
+        scaled["Oil Consumption per capita (tonnes per year)"] * jitter[:, 1]
+    ).round(2)
+    scaled["GDP per capita (US$)"] = (scaled["GDP per capita (US$)"] * jitter[:, 2]).round().astype(int)
+    scaled["GDP per capita (log US$)"] = np.log(scaled["GDP per capita (US$)"])
+    return scaled
+
+def write_scaled_csv(factor, out_dir=CACHE_DIR, source=SOURCE_CSV):
+    """Path of the `factor` times scaled copy of `source` in out_dir, written
+    unless an up-to-date copy is already there."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"oil_consumption_mortality_x{factor}.csv")
+    if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+        # Renamed into place, so an interrupted run leaves no partial file to reuse.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        scale_dataset(pd.read_csv(source), factor).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
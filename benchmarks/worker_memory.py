@@ -0,0 +1,116 @@
+"""Total memory of a gunicorn deployment for several worker counts.
+
+    python -m benchmarks.worker_memory --workers 1 8 --scale 100
+
+Starts gunicorn with gunicorn.conf.py in each serving mode, sends enough
+requests that every worker has served the dashboard, and then adds up RSS and
+PSS over the master and its workers. PSS charges each shared page to the
+processes sharing it, so it shows what the host actually pays. Linux only.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
+
+from benchmarks.synthetic import write_scaled_csv
+from dataset import build_columnar
+
+MODES = {
+    # Every worker imports the app and loads its own copy of the data.
+    "per-worker": {"GUNICORN_PRELOAD": "0", "DATA_MMAP": "0"},
+    # Loaded once in the master, shared with the workers copy-on-write.
+    "preload": {"GUNICORN_PRELOAD": "1", "DATA_MMAP": "0"},
+    # Loaded once in the master from memory-mapped columnar files.
+    "preload+mmap": {"GUNICORN_PRELOAD": "1", "DATA_MMAP": "1"},
+}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def process_tree(pid):
+    pids = [pid]
+    children_path = f"/proc/{pid}/task/{pid}/children"
+    if os.path.exists(children_path):
+        with open(children_path) as f:
+            for child in f.read().split():
+                pids += process_tree(int(child))
+    return pids
+
+def memory_kb(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values
+
+def wait_until_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urlopen(url, timeout=5).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server at {url} did not start")
+
+def measure(mode, workers, data_path):
+    port = free_port()
+    env = {
+        **os.environ,
+        **MODES[mode],
+        "DATA_PATH": data_path,
+        "GUNICORN_WORKERS": str(workers),
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+    }
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/_dash-layout"
+        wait_until_ready(url)
+        # Enough concurrent page loads that every worker builds the layout.
+        with ThreadPoolExecutor(workers * 2) as pool:
+            list(pool.map(lambda _: urlopen(url, timeout=60).read(), range(workers * 20)))
+        time.sleep(0.5)
+
+        pids = process_tree(server.pid)
+        totals = {"Rss": 0, "Pss": 0}
+        for pid in pids:
+            for key, value in memory_kb(pid).items():
+                totals[key] += value
+        return {"processes": len(pids), "rss_mb": totals["Rss"] / 1024, "pss_mb": totals["Pss"] / 1024}
+    finally:
+        server.terminate()
+        server.wait()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--scale", type=int, default=1,
+                        help="replicate the bundled dataset this many times")
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    args = parser.parse_args(argv)
+
+    data_path = write_scaled_csv(args.scale) if args.scale > 1 else "oil_consumption_mortality.csv"
+    build_columnar(data_path)
+
+    print(f"{'mode':>14} {'workers':>7} {'procs':>5} {'total RSS MB':>12} {'total PSS MB':>12}")
+    for mode in args.modes:
+        for workers in args.workers:
+            result = measure(mode, workers, data_path)
+            print(
+                f"{mode:>14} {workers:>7} {result['processes']:>5} "
+                f"{result['rss_mb']:>12.1f} {result['pss_mb']:>12.1f}"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+
+import pytest
+
+from dataset import IndexedDataset, load_csv
+
+# pytest puts this directory on sys.path, so the tests import the app's
+# modules whether run as pytest or python -m pytest.
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+@pytest.fixture(scope="session")
+def csv_path():
+    return os.path.join(ROOT, "oil_consumption_mortality.csv")
+
+@pytest.fixture(scope="session")
+def events_path():
+    return os.path.join(ROOT, "events.csv")
+
+@pytest.fixture(scope="session")
+def data(csv_path):
+    return IndexedDataset(load_csv(csv_path))
+
+@pytest.fixture(scope="session")
+def config(csv_path, events_path):
+    # Settings for dashboard.configure() that hold from any working directory.
+    return {"DATA_PATH": csv_path, "EVENTS_PATH": events_path, "FIGURE_STORE": "none", "DATA_RELOAD_INTERVAL": 0}
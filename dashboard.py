@@ -1,664 +1,947 @@
-from dash import Dash, dcc, html, Input, Output, State
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import pandas as pd
+from dash import Dash, ctx, dcc, html, Input, Output, State, no_update
+from dash.exceptions import PreventUpdate
+from flask import Response, abort, g, request
+from collections import OrderedDict
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+import dataset
+import figures
+import metrics
+from dataset import get_dataset
+from figure_cache import FigureCache, make_store
+from figures import (
+    create_country_fig, create_density_contour_fig, create_mortality_bar_fig, create_oil_bar_fig, create_range_fig,
+)
+from metrics import RequestProfiler
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def default_config():
+    return {
+        "DATA_PATH": os.environ.get("DATA_PATH", "oil_consumption_mortality.csv"),
+        # Memory-map the columnar build (see dataset.py) so that worker
+        # processes share one physical copy of the data.
+        "DATA_MMAP": os.environ.get("DATA_MMAP", "0") == "1",
+        # Seconds between checks of DATA_PATH for a new version, which is then
+        # loaded in the background and swapped in. 0 turns reloading off.
+        "DATA_RELOAD_INTERVAL": float(os.environ.get("DATA_RELOAD_INTERVAL", 0)),
+        "EVENTS_PATH": os.environ.get("EVENTS_PATH", "events.csv"),
+        # Load the dataset inside create_app(), e.g. in a preloading parent
+        # process, instead of on the first request.
+        "PRELOAD_DATA": os.environ.get("PRELOAD_DATA", "0") == "1",
+        "FIGURE_CACHE_SIZE": int(os.environ.get("FIGURE_CACHE_SIZE", 256)),
+        "FIGURE_CACHE_WARMUP": os.environ.get("FIGURE_CACHE_WARMUP", "0") == "1",
+        # "server" computes each animation tick in update_figures; "client" ships
+        # one per-year figure bundle when playback starts and lets the browser
+        # step it.
+        "ANIMATION_MODE": os.environ.get("ANIMATION_MODE", "server"),
+        # Slider and checklist changes are sent once they have been still for
+        # this long, and never while the previous request is in flight.
+        "LIVE_DEBOUNCE_MS": int(os.environ.get("LIVE_DEBOUNCE_MS", 150)),
+        "DENSITY_GRID_SIZE": int(os.environ.get("DENSITY_GRID_SIZE", 0)),
+        # "plotly" or "dict"; see figures.figure_encoding.
+        "FIGURE_ENCODING": os.environ.get("FIGURE_ENCODING", "plotly"),
+        # Serialized figures shared across workers and restarts: "none",
+        # "local", "filesystem", or any object with get/set of bytes (e.g. a
+        # Redis client).
+        "FIGURE_STORE": os.environ.get("FIGURE_STORE", "none"),
+        "FIGURE_STORE_DIR": os.environ.get("FIGURE_STORE_DIR", ".figure_store"),
+        # Files kept by the filesystem store before the oldest are removed;
+        # 0 keeps them all.
+        "FIGURE_STORE_MAX_ENTRIES": int(os.environ.get("FIGURE_STORE_MAX_ENTRIES", 10000)),
+        # Timing and size histograms, served at /metrics.
+        "METRICS": os.environ.get("METRICS", "1") == "1",
+        # Honour the X-Profile request header (cprofile or tracemalloc) and
+        # write the profile to PROFILE_DIR. Off by default.
+        "PROFILE_REQUESTS": os.environ.get("PROFILE_REQUESTS", "0") == "1",
+        "PROFILE_DIR": os.environ.get("PROFILE_DIR", ".profiles"),
+    }
 
-df = pd.read_csv("oil_consumption_mortality.csv")
-app = Dash(__name__)
-server = app.server
+figure_cache = FigureCache()
+diff_cache = FigureCache()
+shared_store = None
+profiler = None
+data_reload_interval = 0
+logger = logging.getLogger(__name__)
+
+# Part of every shared-store key; bump it when the figure builders change
+# so that stored figures from an older release are not served.
+FIGURE_FORMAT_VERSION = 4
+
+def canonical_continents(continents):
+    # Keep subplot order independent of the order boxes were ticked in, so
+    # every selection of the same continents maps to one cache entry.
+    return [c for c in get_dataset().continents if c in continents]
+
+FIGURE_BUILDERS = [
+    ("mortality_bar", create_mortality_bar_fig),
+    ("oil_bar", create_oil_bar_fig),
+    ("density_contour", create_density_contour_fig),
+]
 
-years = list(set([year for year in df["Year"] if year % 1 == 0]))
-years.sort()
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value).encode()
 
-continents = list(set(df["Continent"]))
+def loads(payload):
+    return orjson.loads(payload) if orjson is not None else json.loads(payload)
 
-oil_prod_10M_12M_barrels_day = ['United States', 'Saudi Arabia', 'Russia']
-oil_prod_1M_5M_barrels_day = [    
-    'Canada', 'China', 'Brazil', 'Iraq', 'Iran', 'Libya',
-    'United Arab Emirates', 'Kuwait', 'Kazakhstan', 'Angola',
-    'Mexico', 'Norway', 'Qatar', 'Oman', 'Nigeria', 'Algeria'
-]
-oil_prod_500k_1M_barrels_day = [
-    'Colombia', 'United Kingdom', 'Venezuela', 'Azerbaijan',
-    'Indonesia', 'India', 'Argentina', 'Egypt', 'Malaysia'
-]
-oil_prod_100k_500k_barrels_day = [
-    'Ecuador', 'Australia', 'Guyana', 'Congo, Rep.', 'Gabon',
-    'Turkmenistan', 'Bahrein', 'Ghana', 'Vietnam', 'South Sudan',
-    'Thailand', 'Equatorial Guinea',
-]
-oil_prod_10k_100k_barrels_day = [
-    'Syria', 'Italy', 'Brunei', 'Chad', 'Pakistan', 'Turkey',
-    'Sudan', 'Denmark', 'Romania', 'Cameroon', 'Trinidad and Tobago',
-    'Yemen', 'Peru', 'Papua New Guinea', 'Uzbekistan',
-    'Tunisia', 'Germany', 'Cuba', 'Belarus', 'Cote d\'Ivoire',
-    'Netherlands', 'Bolivia', 'Congo, Dem. Rep.', 'Hungary',
-    'Poland', 'Mongolia', 'Albania', 'Serbia', 'East Timor',
-    'Suriname', 'France', 'Croatia'
-]
+def build_figures(year, continents):
+    if figures.figure_encoding != "plotly":
+        return (
+            figures.create_bar_dict("mortality_bar", year, continents),
+            figures.create_bar_dict("oil_bar", year, continents),
+            figures.create_density_contour_dict(year, continents),
+        )
 
-df['Oil Producing Countries'] = df['Country'].apply(
-    lambda x: '10M-12M barrels/day' 
-    if x in oil_prod_10M_12M_barrels_day else (
-    '1M-5M barrels/day'
-    if x in oil_prod_1M_5M_barrels_day else (
-    '500k-1M barrels/day'
-    if x in oil_prod_500k_1M_barrels_day else (
-    '100k-500k barrels/day'
-    if x in oil_prod_100k_500k_barrels_day else (
-    '10k-100k barrels/day'
-    if x in oil_prod_10k_100k_barrels_day else (
-    '<10k barrels/day'
-    ))))))
-
-def create_density_contour_fig(year, continents):
-    mask = (df["Continent"].isin(continents) & (df["Year"] == year))
-    filtered_df = df.loc[mask]
-    mortality_levels = [50, 100, 200, 400]
-    levels_text = ['Low (50)', 'Medium (100)', 'High (200)', 'Very High (400)']
-
-    colors = ['#648fff', '#785ef0', '#dc267f', '#fe6100', '#ffb000']
-
-    x_range = [
-        0,
-        max(filtered_df["GDP per capita (US$)"]) + 1000
-    ]
+    # Cached as plain JSON-compatible dicts so they can be diffed and shipped
+    # without going through the figure objects again.
+    built = []
+    for name, create in FIGURE_BUILDERS:
+        fig = create(year, continents)
+        with metrics.timed("dashboard_figure_phase_seconds", figure=name, phase="serialize"):
+            encoded = fig.to_json()
+            built.append(json.loads(encoded))
+        metrics.observe("dashboard_figure_bytes", len(encoded), figure=name)
+    return tuple(built)
+
+def build_range_figure(start, end, continents):
+    # Not cached: it is built from the range sums in well under a millisecond
+    # as a dict, so a cache would only trade memory for nothing.
+    if figures.figure_encoding != "plotly":
+        return figures.create_range_dict(start, end, continents)
+    return create_range_fig(start, end, continents)
+
+def build_country_figure(country):
+    if figures.figure_encoding != "plotly":
+        return figures.create_country_dict(country)
+    return create_country_fig(country)
+
+# Shown until a bar is clicked.
+COUNTRY_PLACEHOLDER = {
+    "layout": {
+        "title": {"text": "Click a bar above to see that country's history"},
+        "xaxis": {"visible": False},
+        "yaxis": {"visible": False},
+    },
+}
+
+@functools.lru_cache(maxsize=8)
+def _figure_version(density_grid_size, events_path):
+    # The figure encoding is not part of it: "plotly" and "dict" figures are identical.
+    with open(events_path, "rb") as f:
+        events_hash = hashlib.sha256(f.read()).hexdigest()[:16]
+    return f"{FIGURE_FORMAT_VERSION}-{density_grid_size}-{events_hash}"
+
+def figure_version():
+    return _figure_version(figures.density_grid_size, figures.events_path)
+
+def figure_key(year, continents):
+    # Content addressed: the same data, settings and state give the same key
+    # in every worker and after every restart. The data part covers only the
+    # rows the state is built from, so a reload that leaves them unchanged
+    # keeps the key.
+    continents = canonical_continents(continents)
+    state_version = get_dataset().state_version(int(year), continents)
+    return f"figures:{figure_version()}:{state_version}:{int(year)}:{','.join(continents)}"
+
+def state_key(year, continents):
+    # The in-process cache key. It carries the state's data version for the
+    # same reason: a figure built from data that has since been reloaded is
+    # stored under a key the new data never looks up.
+    return (*FigureCache.make_key(year, continents), get_dataset().state_version(int(year), continents))
+
+def figure_etag(key):
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+def load_or_build_figures(year, continents):
+    key = figure_key(year, continents)
+    if shared_store is not None:
+        payload = shared_store.get(key)
+        if payload is not None:
+            return tuple(loads(payload))
+    built = build_figures(year, continents)
+    if shared_store is not None:
+        shared_store.set(key, dumps(built))
+    return built
+
+def get_figures(year, continents):
+    continents = canonical_continents(continents)
+    key = state_key(year, continents)
+    return figure_cache.get_or_build(key, lambda: load_or_build_figures(year, continents))
+
+def get_figures_json(year, continents):
+    continents = canonical_continents(continents)
+    key = figure_key(year, continents)
+    payload = shared_store.get(key) if shared_store is not None else None
+    if payload is None:
+        # Not through get_figures(): on a miss, load_or_build_figures() would
+        # look the key up and encode and store the figures a second time.
+        built = figure_cache.get_or_build(state_key(year, continents), lambda: build_figures(year, continents))
+        payload = dumps(built)
+        if shared_store is not None:
+            shared_store.set(key, payload)
+    return payload
+
+def serve_figures(year):
+    """The three figures for one state as JSON, revalidated by ETag.
+
+    The ETag is derived from the key alone, so a matching If-None-Match is
+    answered without building or encoding anything.
+    """
+    data = get_dataset()
+    if year not in data.years:
+        abort(404)
+    selection = request.args.get("continents")
+    continents = canonical_continents(selection.split(",") if selection else data.continents)
+    if not continents:
+        abort(400, "continents lists none of: " + ", ".join(data.continents))
+
+    etag = figure_etag(figure_key(year, continents))
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(get_figures_json(year, continents), mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+def build_figure_bundle(continents):
+    continents = canonical_continents(continents)
+    years = get_dataset().years
+    return {
+        "continents": continents,
+        "years": [int(year) for year in years],
+        "figures": {
+            str(year): list(get_figures(year, continents))
+            for year in years
+        },
+    }
 
-    y_range = [
-        0,
-        max(filtered_df["Oil Consumption per capita (tonnes per year)"]) + 5
-    ]
+DELETE = object()
+
+def is_dict_list(value):
+    return isinstance(value, list) and all(isinstance(item, dict) for item in value)
+
+# Strings sharing at least this many leading characters, such as titles
+# that differ only in the year, are sent as the old prefix plus a new tail.
+TEXT_PREFIX_MIN = 16
+
+def op_size(location, value, keep=None):
+    # Rough JSON size of one operation as encode_ops sends it.
+    size = len(".".join(map(str, location))) + 6 + (0 if value is DELETE else len(json.dumps(value)))
+    return size if keep is None else size + len(str(keep)) + 1
+
+def text_op(location, old, new):
+    keep = len(os.path.commonprefix([old, new]))
+    # Python counts code points and JavaScript UTF-16 units; they agree on ASCII.
+    if keep >= TEXT_PREFIX_MIN and new[:keep].isascii():
+        return (location, new[keep:], keep)
+    return (location, new)
+
+def diff_figure(old, new, path=()):
+    """Operations turning figure dict `old` into `new`: (location, value)
+    sets a value, (location, DELETE) removes it and (location, text, keep)
+    sets a string to the first `keep` characters of the old one plus `text`."""
+    ops = []
+    for key, value in new.items():
+        location = path + (key,)
+        if key not in old:
+            ops.append((location, value))
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            ops += diff_figure(old[key], value, location)
+        elif is_dict_list(value) and is_dict_list(old[key]):
+            # Lists of dicts (traces, shapes, annotations) are diffed per
+            # item so only the changed arrays are sent, and items past the
+            # end of the shorter list are appended or removed.
+            for i, (old_item, new_item) in enumerate(zip(old[key], value)):
+                ops += diff_figure(old_item, new_item, location + (i,))
+            ops += [(location + (i,), value[i]) for i in range(len(old[key]), len(value))]
+            ops += [(location + (i,), DELETE) for i in reversed(range(len(value), len(old[key])))]
+        elif isinstance(value, str) and isinstance(old[key], str) and value != old[key]:
+            ops.append(text_op(location, old[key], value))
+        elif value != old[key]:
+            ops.append((location, value))
+    ops += [(path + (key,), DELETE) for key in old.keys() - new.keys()]
+
+    # A dict whose operations would cost more than the dict itself is set whole.
+    if path and len(ops) > 1 and sum(op_size(*op) for op in ops) >= op_size(path, new):
+        return [(path, new)]
+    return ops
+
+def compact_numbers(value):
+    # 2431.0 is sent as 2431; JavaScript has a single number type anyway.
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, list):
+        return [compact_numbers(item) for item in value]
+    if isinstance(value, dict):
+        return {key: compact_numbers(item) for key, item in value.items()}
+    return value
+
+def encode_ops(ops):
+    """Operations as APPLY_FIGURE_DELTA_JS applies them: [path] removes,
+    [path, value] sets and [path, text, keep] keeps a string's prefix, with
+    dotted paths. Operations setting equal values, such as the same range on
+    every subplot axis, share one entry that lists their paths."""
+    encoded = []
+    by_value = {}
+    for location, value, *keep in ops:
+        path = ".".join(map(str, location))
+        if value is DELETE:
+            encoded.append([path])
+            continue
+        if keep:
+            encoded.append([path, value, *keep])
+            continue
+        key = json.dumps(value)
+        if key in by_value:
+            entry = by_value[key]
+            entry[0] = [*entry[0], path] if isinstance(entry[0], list) else [entry[0], path]
+        else:
+            by_value[key] = entry = [path, compact_numbers(value)]
+            encoded.append(entry)
+    return encoded
+
+def get_figure_diffs(rendered_year, rendered_continents, year, continents):
+    rendered_continents = canonical_continents(rendered_continents)
+    continents = canonical_continents(continents)
+    key = (
+        state_key(rendered_year, rendered_continents),
+        state_key(year, continents),
+    )
 
-    fig = make_subplots(
-        rows=1,
-        cols=len(continents),
-        subplot_titles=continents,
-        shared_xaxes=False,
-        shared_yaxes=False,
-        horizontal_spacing=0.05,
+    def build():
+        previous = get_figures(rendered_year, rendered_continents)
+        figures = get_figures(year, continents)
+        return [encode_ops(diff_figure(old, new)) for old, new in zip(previous, figures)]
+
+    return diff_cache.get_or_build(key, build)
+
+def warm_figure_cache(background=True):
+    def keys():
+        data = get_dataset()
+        return [state_key(year, data.continents) for year in data.years]
+
+    def build(key):
+        return build_figures(key[0], get_dataset().continents)
+
+    return figure_cache.warm(keys, build, background=background)
+
+def cache_stats():
+    return figure_cache.stats()
+
+reload_stats = {"reloads": 0, "changed_groups": 0}
+
+def reload_data():
+    """Swap in DATA_PATH if it changed, and drop the cached figures and
+    patches of the states whose rows changed. Every other state keeps its
+    cache entries, and its shared-store key, across the reload."""
+    swapped = dataset.reload_if_changed()
+    if swapped is None:
+        return None
+    old, new = swapped
+    changed = old.changed_groups(new)
+
+    def affected(key):
+        year, continents = key[0], key[1]
+        return changed is None or any((year, continent) in changed for continent in continents)
+
+    dropped = figure_cache.invalidate(affected)
+    dropped += diff_cache.invalidate(lambda key: affected(key[0]) or affected(key[1]))
+    reload_stats["reloads"] += 1
+    reload_stats["changed_groups"] += len(new.group_versions) if changed is None else len(changed)
+    logger.info(
+        "Reloaded %s: %s (year, continent) groups changed, %d cache entries dropped",
+        dataset.data_path, "all" if changed is None else len(changed), dropped,
     )
+    return changed, dropped
+
+def watch_data(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            reload_data()
+        except Exception:
+            # A file caught mid-write fails to parse; the next check retries
+            # and the current data stays in use meanwhile.
+            logger.exception("Reloading %s failed", dataset.data_path)
+
+watcher_pid = None
+watcher_lock = threading.Lock()
+
+def start_data_watcher():
+    # Started from the first request of each serving process rather than in
+    # create_app(), so a preloading gunicorn master never forks while the
+    # thread holds a lock and each worker watches for itself.
+    global watcher_pid
+    if data_reload_interval <= 0 or watcher_pid == os.getpid():
+        return
+    with watcher_lock:
+        if watcher_pid != os.getpid():
+            watcher_pid = os.getpid()
+            threading.Thread(target=watch_data, args=(data_reload_interval,), name="data-watcher", daemon=True).start()
+
+def serve_metrics():
+    stats = figure_cache.stats()
+    extra = {
+        "dashboard_figure_cache_entries": ("gauge", "Figure sets in the in-process cache.", stats["size"]),
+        **{
+            f"dashboard_figure_cache_{key}_total": ("counter", f"Figure cache {key}.", stats[key])
+            for key in ("hits", "misses", "evictions", "invalidations")
+        },
+        "dashboard_data_reloads_total": ("counter", "Dataset reloads swapped in.", reload_stats["reloads"]),
+        "dashboard_data_changed_groups_total": (
+            "counter", "(year, continent) groups changed by reloads.", reload_stats["changed_groups"],
+        ),
+    }
+    return Response(metrics.render_prometheus(extra), mimetype="text/plain; version=0.0.4")
+
+def instrumented(name, callback):
+    @functools.wraps(callback)
+    def wrapper(*args):
+        g.callback_name = name
+        with metrics.timed("dashboard_callback_seconds", callback=name):
+            return callback(*args)
+    return wrapper
+
+def before_request():
+    start_data_watcher()
+    g.request_start = time.perf_counter()
+    kind = request.headers.get("X-Profile")
+    if profiler is not None and kind:
+        g.profile_session = profiler.start(kind)
+
+def after_request(response):
+    name = g.get("callback_name")
+    if name is not None:
+        metrics.observe("dashboard_callback_request_seconds", time.perf_counter() - g.request_start, callback=name)
+        if response.content_length is not None:
+            metrics.observe("dashboard_callback_response_bytes", response.content_length, callback=name)
+    session = g.get("profile_session")
+    if session is not None:
+        response.headers["X-Profile"] = profiler.stop(session, name or request.endpoint or "request")
+    return response
+
+def serve_layout():
+    data = get_dataset()
+    first_year = data.years[0]
+    initial_figures = get_figures(first_year, data.continents)
+
+    return html.Div(
+        [
+            html.H2(children='Mortality rate based on oil consumption and GDP per capita'),
+            html.Div(style={'margin': '0px 0px -10px 0px'}),
+
+            html.Div(
+                children=[
+                    html.Div(dcc.Checklist(
+                        id="checklist",
+                        options=[
+                            {"label": continent, "value": continent} for continent in data.continents
+                        ],
+                        value=data.continents,
+                        inline=True,
+                        style={'display': 'inline-block'}
+                    ), style={'display': 'inline-block', 'margin': '0px 20px 0px 0px'}),
+
+                    html.Div(dcc.Slider(
+                        id="year-slider",
+                        min=data.years[0],
+                        max=data.years[-1],
+                        value=first_year,
+                        marks={str(year-1): str(year-1) for year in data.years if year % 2 == 0},
+                        step=None,
+                        updatemode="drag",
+                    ), style={'width': '60%', 'display': 'inline-block', 'margin': '0px 20px 0px 0px'}),
+
+                    html.Button("Play", id="play", style={'width': '5%', 'display': 'inline-block'}),
+                ],
+                style={'margin': '0px 0px'}
+            ),
 
-    for i, continent in enumerate(continents, start=1):
-        continent_df = filtered_df[filtered_df["Continent"] == continent]
-
-        # x_range_continent = max(continent_df["GDP per capita (US$)"]) + 1000
-        # y_range_continent = max(continent_df["Oil Consumption per capita (tonnes per year)"]) + 5
-        
-        hist2d_contour = go.Histogram2dContour(
-            x=continent_df["GDP per capita (US$)"],
-            y=continent_df["Oil Consumption per capita (tonnes per year)"],
-            z=continent_df["Mortality Rate"],
-            histfunc="avg",
-            colorscale=colors,
-            autocontour=False,
-            contours_coloring="fill",
-            line=dict(width=1),
-            hovertemplate="Mortality Rate: %{z}<br>Oil Consumption: %{y}<br>GDP per capita: %{x}<extra></extra>",
-            showscale=True,
-            contours=dict(
-                start=min(mortality_levels),
-                end=max(mortality_levels),
-                size=(max(mortality_levels) - min(mortality_levels)) / len(mortality_levels),
+            dcc.Interval(id="animate", interval=3000, disabled=True),
+            dcc.Store(id="figure-bundle"),
+            dcc.Store(id="rendered-state", data=rendered_state(first_year, data.continents)),
+            dcc.Store(id="requested-state"),
+            dcc.Store(id="figure-delta"),
+            dcc.Store(id="render-ack"),
+            dcc.Store(id="years", data=[int(year) for year in data.years]),
+
+            dcc.Graph(id="graph-with-slider3", style={'height': '250px', 'margin': '10px 0px'}, figure=initial_figures[2]),
+
+            html.Div(
+                children=[
+                    dcc.Graph(
+                        id="graph-with-slider",
+                        style={'width': '48%', 'height': '275px', 'display': 'inline-block', 'margin': '0px', 'padding': '0px'},
+                        figure=initial_figures[0]
+                    ),
+                    dcc.Graph(
+                        id="graph-with-slider2",
+                        style={'width': '48%', 'height': '275px', 'display': 'inline-block', 'margin': '0px', 'padding': '0px'},
+                        figure=initial_figures[1]
+                    ),
+                ],
+                style={'margin': '10px 0px'}
             ),
-            colorbar=dict(
-                title="Mortality Rate (per 1000 births)",
-                tickvals=mortality_levels,
-                ticktext=levels_text,
+            dcc.Graph(id="country-graph", style={'height': '275px', 'margin': '10px 0px'}, figure=COUNTRY_PLACEHOLDER),
+            html.Div(
+                children=[
+                    dcc.RangeSlider(
+                        id="year-range",
+                        min=data.years[0],
+                        max=data.years[-1],
+                        value=[data.years[0], data.years[-1]],
+                        marks={str(year-1): str(year-1) for year in data.years if year % 2 == 0},
+                        step=1,
+                        allowCross=False,
+                        # One request when a handle is released, not one per
+                        # step of the drag.
+                        updatemode="mouseup",
+                    ),
+                    dcc.Graph(
+                        id="range-graph",
+                        style={'height': '450px'},
+                        figure=build_range_figure(data.years[0], data.years[-1], data.continents),
+                    ),
+                ],
+                style={'margin': '10px 0px'}
             ),
-        )
-
-        fig.add_trace(hist2d_contour, row=1, col=i)
-        fig.update_xaxes(title_text="GDP per capita (US$)", title_standoff=5,
-                        range=x_range,
-                        title_font_size=14, row=1, col=i)
-        fig.update_yaxes(title_text="Oil Consumption per<br>capita (tonnes per year)",
-                        title_standoff=0, title_font_size=14,
-                        range=y_range,
-                        row=1, col=i)
-
-        # Add annotations for wars
-        wars_annotations = {
-            'Asia': {
-                'Vietnam': (1965, 1975),
-                'Vietnam-China': (1979, 1991),
-                'Indonesia-Malaysia': (1965, 1966),
-                'India-Pakistan': (1965, 1969),
-                'Korea': (1966, 1969),
-                'Israel': (1967, 1970),
-                'Cambodia': (1967, 1975),
-                'Cambodia-Vietnam': (1978, 1989),
-                'Soviet-Afghanistan': (1979, 1989),
-                'Iran-Iraq': (1974, 1975),
-                'Indonesia-Timor': (1975, 1976),
-                'Iran-Iraq': (1980, 1988),
-                'Malaysia': (1968, 1989),
-                'Azerbaijan': (1988, 1994),
-                'Gulf': (1990, 1991),
-                'Iraq': (2003, 2004),
-                'Afghanistan': (1989, 1992),
-                'Iraq': (1994, 1997),
-                'Afghanistan': (1996, 2002),
-            },
-            'Africa': {
-                'Sudan': (1965, 1972),
-                'Sudan': (1983, 2005),
-                'Congo': (1960, 1966),
-                'Egypt-Libya': (1977,),
-                'Algeria': (1991, 2002),
-                'Nigeria': (1967, 1970),
-                'Somalia-Ethiopia': (1977, 1978),
-                'Chad-Libya': (1978, 1987),
-                'Uganda-Tanzania': (1978, 1979),
-                'Yemen': (1979,),
-                'Ethiopia-Somalia': (1982,),
-                'Ethiopia': (1974, 1991),
-                'Lebanon': (1975, 1990),
-                'Angola': (1979, 2002),
-                'Chad-Nigeria': (1983,),
-                'Mauritania-Senegal': (1989, 1991),
-                'Congo': (1996, 1997),
-                'Congo': (1998, 2003),
-                'Eritrea-Ethiopia': (1998, 2000),
-                'Eritrea': (2008,),
-            },
-            'Europe': {
-                'Chechen Rep.': (1994, 1996),
-                'Chechen Rep.': (1999, 2000),
-                'Georgia': (1991, 1993),
-                'Albania': (1997,),
-                'Kosovo': (1998, 1999),
-            },
-        }
-
-        annotation_text = ''
-        for continent_key, wars in wars_annotations.items():
-            if continent == continent_key:
-                for war, years_range in wars.items():
-                    if len(years_range) == 1:
-                        annotation_text += f'{war}<br>'
-                    else:
-                        start_year, end_year = years_range
-                        if start_year <= year <= end_year:
-                            annotation_text += f'{war}<br>'
-
-        if annotation_text:
-            fig.add_annotation(
-                go.layout.Annotation(
-                    xref="x",
-                    yref="y",
-                    x=x_range[1] - 0.4 * (x_range[1] - x_range[0]),
-                    y=y_range[1] - 0.5 * (y_range[1] - y_range[0]),
-                    text=f'<b>Wars ({year}):</b><br>{annotation_text}',
-                    showarrow=False,
-                    font=dict(size=10, color='black'),
-                    align='left',
-                    bordercolor='black',
-                    borderwidth=1,
-                ),
-                row=1, col=i,
-            )
-
-    fig.update_layout(
-        title=f'Mortality Rate vs Oil Consumption and GDP per capita in {year}',
-        margin=dict(l=20, r=20, t=50, b=20),
-        font=dict(size=12),
-        coloraxis_showscale=False
+            html.Div([
+                html.P('The proprietary of the data used in this dashboard is The World Bank (CC BY-4.0 license).'),
+            ])
+        ]
     )
 
-    return fig
-
-def create_mortality_bar_fig(year, continents):
-    mask = (df["Continent"].isin(continents) & (df["Year"] == year))
-    top_10 = df[mask].nlargest(10, 'Mortality Rate')
-    top_10 = top_10.sort_values(by='Mortality Rate', ascending=True)
-    top_10.reset_index(drop=True, inplace=True)
-    
-    mortality_levels = [50, 100, 200, 400]
-    levels_text = ['Low (50)', 'Medium (100)', 'High (200)', 'Very High (400)']
-    alpha_mapping = {
-        50: 0.15,
-        100: 0.3,
-        200: 0.55,
-        400: 0.8
-    }
-    color_mapping = {
-        'Asia': '#648fff',
-        'Europe': '#785ef0',
-        'Africa': '#dc267f',
-        'North America':'#fe6100',
-        'South America': '#ffb000',
-        'Oceania': '#054fb9'
+def validation_layout():
+    # Every component id used by a callback, without touching the data. Dash
+    # would otherwise call serve_layout() when the layout is assigned.
+    return html.Div([
+        dcc.Checklist(id="checklist", options=[]),
+        dcc.Slider(id="year-slider", min=0, max=1),
+        html.Button(id="play"),
+        dcc.Interval(id="animate"),
+        dcc.Store(id="figure-bundle"),
+        dcc.Store(id="rendered-state"),
+        dcc.Store(id="requested-state"),
+        dcc.Store(id="figure-delta"),
+        dcc.Store(id="render-ack"),
+        dcc.Store(id="years"),
+        dcc.Graph(id="graph-with-slider"),
+        dcc.Graph(id="graph-with-slider2"),
+        dcc.Graph(id="graph-with-slider3"),
+        dcc.RangeSlider(id="year-range", min=0, max=1),
+        dcc.Graph(id="range-graph"),
+        dcc.Graph(id="country-graph"),
+    ])
+
+
+# Newest request seq seen per browser tab. A request that a newer one from
+# the same tab has overtaken is dropped instead of built and sent.
+latest_requests = OrderedDict()
+latest_requests_lock = threading.Lock()
+LATEST_REQUESTS_SIZE = 10000
+
+def is_superseded(client, seq, record=False):
+    with latest_requests_lock:
+        latest = latest_requests.get(client, -1)
+        if record and seq > latest:
+            latest_requests[client] = latest = seq
+            latest_requests.move_to_end(client)
+            while len(latest_requests) > LATEST_REQUESTS_SIZE:
+                latest_requests.popitem(last=False)
+        return seq < latest
+
+def rendered_state(year, continents):
+    # The version is that of the data the figures were built from. After a
+    # reload it no longer matches for the states whose rows changed, and the
+    # figures the browser shows can't be patched from the new data's ones.
+    continents = canonical_continents(continents)
+    return {
+        "year": int(year),
+        "continents": continents,
+        "version": get_dataset().state_version(int(year), continents),
     }
-    
-    def get_alpha(rate):
-        if rate <= 50:
-            return alpha_mapping[50]
-        elif rate <= 100:
-            return alpha_mapping[100]
-        elif rate <= 200:
-            return alpha_mapping[200]
-        elif rate <= 400:
-            return alpha_mapping[400]
-        else:
-            return 1
-    
-    def get_color(continent):
-        return color_mapping[continent]
-
-    top_10['alpha'] = top_10['Mortality Rate'].apply(get_alpha)
-    top_10['color'] = top_10['Continent'].apply(get_color)
-    
-    shapes = []
-    annotations = []
-
-    for level, text in zip(mortality_levels, levels_text):
-        shapes.append(
-            dict(
-                type='line',
-                x0=level,
-                x1=level,
-                y0=-1,
-                y1=len(top_10),
-                line=dict(color='black', width=1)
-            )
-        )
 
-        annotations.append(
-            dict(
-                x=level-20,
-                y=len(top_10) // 2 + 0.5,
-                text=text,
-                showarrow=False,
-                font=dict(size=12),
-                textangle=90
-            )
-        )
+def update_figures(requested, rendered=None):
+    """Render the state the browser asked for, as a delta the browser applies
+    to its graphs (APPLY_FIGURE_DELTA_JS): whole figures, or the operations
+    that turn the figures of the state they already show into the new ones.
+    Whole figures are sent when the shown ones were built from data that has
+    since been reloaded."""
+    client, seq = requested.get("client"), requested.get("seq")
+    if client is not None and is_superseded(client, seq, record=True):
+        raise PreventUpdate
+    year, continents = requested["year"], canonical_continents(requested["continents"])
+    if year not in get_dataset().years or not continents:
+        # Nothing to draw, e.g. with every continent unticked. The graphs
+        # keep what they show, and the empty delta still acknowledges the
+        # request so the browser sends the next one.
+        if rendered is None:
+            raise PreventUpdate
+        year, continents = rendered["year"], rendered["continents"]
+
+    # Taken before the figures are built: a reload in between then leaves a
+    # stale version, which costs the next tick whole figures, never a bad patch.
+    state = rendered_state(year, continents)
+    shown = rendered is not None and rendered_state(rendered["year"], rendered["continents"])
+    if not shown or rendered.get("version") != shown["version"]:
+        delta = {"figures": list(get_figures(year, continents))}
+    else:
+        delta = {"ops": get_figure_diffs(rendered["year"], rendered["continents"], year, continents)}
+
+    if client is not None:
+        if is_superseded(client, seq):
+            raise PreventUpdate
+        state["seq"] = seq
+    # Stored as rendered-state once the graphs show it.
+    delta["state"] = state
+    return delta
+
+def update_range_figure(year_range, continents):
+    start, end = year_range
+    return build_range_figure(start, end, canonical_continents(continents))
+
+def update_country_figure(mortality_click, oil_click):
+    click = mortality_click if ctx.triggered_id == "graph-with-slider" else oil_click
+    if not click:
+        raise PreventUpdate
+    # Every bar carries its country as the first customdata field.
+    country = click["points"][0]["customdata"][0]
+    if country not in get_dataset().countries.slices:
+        raise PreventUpdate
+    return build_country_figure(country)
+
+def load_figure_bundle(continents, n, bundle):
+    selection = canonical_continents(continents)
+    if not selection or (bundle and bundle["continents"] == selection):
+        return no_update
+    return build_figure_bundle(selection)
 
-    traces = []
-    legend_labels = set()
-
-    for i, row in top_10.iterrows():
-        alpha = row['alpha']
-        continent = row['Continent']
-
-        if continent not in legend_labels:
-            legend_labels.add(continent)
-            traces.append(go.Bar(
-                x=[None],
-                y=[None],
-                legendgroup=continent,
-                name=continent,
-                marker=dict(color=color_mapping[continent]),
-                showlegend=True
-            ))
-
-        traces.append(go.Bar(
-            x=[row['Mortality Rate']],
-            y=[i],
-            orientation='h',
-            marker=dict(
-                color=row['color'],
-                opacity=alpha
-            ),
-            legendgroup=continent,
-            showlegend=False,
-            name=continent,
-            hovertemplate=f"Continent: {continent}<br>Mortality Rate: {row['Mortality Rate']}<br>Country: {row['Country']}"
-        ))
-
-    layout = go.Layout(
-        title=f'Top 10 Countries by Mortality Rate in {year}',
-        xaxis=dict(title='Mortality Rate (per 1000 births)', 
-                range=[0, df["Mortality Rate"].max() * 1.1], title_standoff=0),
-        yaxis=dict(title='Country', categoryorder='total ascending',
-                tickvals=top_10.index, ticktext=top_10['Country'], title_standoff=0),
-        margin=dict(l=20, r=20, t=30, b=20),
-        font=dict(size=12),
-        xaxis_autorange=False,
-        yaxis_autorange=True,
-        legend=dict(title='Continent', traceorder='reversed', itemclick='toggleothers', itemdoubleclick='toggle'),
-        shapes=shapes,
-        annotations=annotations
-    )
+def toggle(n, playing):
+    if n:
+        return not playing
+    return playing
 
-    fig = go.Figure(data=traces, layout=layout)
-
-    return fig
-
-def create_oil_bar_fig(year, continents):
-    mask = (df["Continent"].isin(continents) & (df["Year"] == year))
-    top_10 = df[mask].nlargest(10, 'Oil Consumption per capita (tonnes per year)')
-    top_10 = top_10.sort_values(by='Oil Consumption per capita (tonnes per year)', ascending=True)
-    top_10.reset_index(drop=True, inplace=True)
-    
-    oil_levels = [2, 4, 7.5, 10]
-    levels_text = ['Low (2)', 'Medium (4)', 'High (7.5)', 'Very High (10)']
-    alpha_mapping = {
-        2: 0.15,
-        4: 0.3,
-        7.5: 0.55,
-        10: 0.8
+# Browser side of the live updates in server mode. Every render request goes
+# through REQUEST_STATE_JS: slider and checklist changes once they have been
+# still for the debounce time, animation ticks straight away. A request
+# waits while the previous one is in flight (ACKNOWLEDGE_RENDER_JS ends the
+# wait when its figures arrive) and is dropped if a newer change came in
+# meanwhile, so a drag across many years renders only a few of them.
+LIVE_STATE_JS = """
+    const live = window.dashboardLive = window.dashboardLive || {
+        client: Math.random().toString(36).slice(2), seq: 0, changes: 0, inFlight: null, waiters: [],
+    };
+    const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+    const wake = () => live.waiters.splice(0).forEach(resolve => resolve());
+    if (!live.watching) {
+        // A render request that fails, with an error status, no content or
+        // a network error, ends the wait at once rather than after the stall
+        // time: no rendered state will arrive for it.
+        live.watching = true;
+        const fetch = window.fetch;
+        window.fetch = function(url, options) {
+            const response = fetch.apply(this, arguments);
+            const body = options && typeof options.body === "string" ? options.body : "";
+            if (String(url).includes("_dash-update-component") && body.includes('"requested-state"')) {
+                const seq = (JSON.parse(body).inputs[0].value || {}).seq;
+                const release = () => {
+                    if (live.inFlight === seq) {
+                        live.inFlight = null;
+                        wake();
+                    }
+                };
+                response.then(result => result.status === 200 || release(), release);
+            }
+            return response;
+        };
     }
-    color_mapping = {
-        'Asia': '#648fff',
-        'Europe': '#785ef0',
-        'Africa': '#dc267f',
-        'North America':'#fe6100',
-        'South America': '#ffb000',
-        'Oceania': '#054fb9'
+"""
+
+REQUEST_STATE_JS = """
+async function(n, year, continents, years) {
+    %(state)s
+    const noUpdate = window.dash_clientside.no_update;
+    const ticked = window.dash_clientside.callback_context.triggered
+        .some(t => t.prop_id === "animate.n_intervals");
+    const change = ++live.changes;
+    // Older invocations still waiting give up now; Dash drops their results.
+    wake();
+    if (ticked) {
+        year = years[(years.indexOf(year) + 1) %% years.length];
+    } else {
+        await sleep(%(debounce_ms)d);
     }
-    
-    def get_alpha(rate):
-        if rate <= 2:
-            return alpha_mapping[2]
-        elif rate <= 4:
-            return alpha_mapping[4]
-        elif rate <= 7.5:
-            return alpha_mapping[7.5]
-        elif rate <= 10:
-            return alpha_mapping[10]
-        else:
-            return 1
-
-    def get_color(continent):
-        return color_mapping[continent]
-
-    top_10['alpha'] = top_10['Oil Consumption per capita (tonnes per year)'].apply(get_alpha)
-    top_10['color'] = top_10['Continent'].apply(get_color)
-    
-    shapes = []
-    annotations = []
-
-    for level, text in zip(oil_levels, levels_text):
-        shapes.append(
-            dict(
-                type='line',
-                x0=level,
-                x1=level,
-                y0=-1,
-                y1=len(top_10),
-                line=dict(color='black', width=1)
-            )
-        )
-
-        annotations.append(
-            dict(
-                x=level-0.5,
-                y=len(top_10) // 2 + 0.5,
-                text=text,
-                showarrow=False,
-                font=dict(size=12),
-                textangle=90
-            )
-        )
-        
-    traces = []
-    legend_labels = set()
-
-    for i, row in top_10.iterrows():
-        alpha = row['alpha']
-        continent = row['Continent']
-
-        if continent not in legend_labels:
-            legend_labels.add(continent)
-            traces.append(go.Bar(
-                x=[None],
-                y=[None],
-                legendgroup=continent,
-                name=continent,
-                marker=dict(color=color_mapping[continent]),
-                showlegend=True
-            ))
-
-        traces.append(go.Bar(
-            x=[row['Oil Consumption per capita (tonnes per year)']],
-            y=[i],
-            orientation='h',
-            marker=dict(
-                color=row['color'],
-                opacity=alpha
-            ),
-            legendgroup=continent,
-            showlegend=False,
-            name=continent,
-            hovertemplate=f"Continent: {continent}<br>Oil Consumption per capita: {row['Oil Consumption per capita (tonnes per year)']}<br>Country: {row['Country']}<br>Oil Production: {row['Oil Producing Countries']}"
-        ))
-
-    layout = go.Layout(
-        title=dict(
-            text=f'Top 10 Countries by Oil Consumption<br>per capita (tonnes per year) in {year}',
-            y=0.95
-        ),
-        xaxis=dict(title='Oil Consumption per<br>capita (tonnes per year)', 
-                range=[0, df["Oil Consumption per capita (tonnes per year)"].max() * 1.1],
-                title_standoff=0),
-        yaxis=dict(title='Country', categoryorder='total ascending', tickvals=top_10.index, 
-                ticktext=top_10['Country'], title_standoff=0),
-        margin=dict(l=20, r=20, t=50, b=20),
-        font=dict(size=12),
-        xaxis_autorange=False,
-        yaxis_autorange=True,
-        legend=dict(title='Continent', traceorder='reversed', itemclick='toggleothers', itemdoubleclick='toggle'),
-        shapes=shapes,
-        annotations=annotations
-    )
-
-    fig = go.Figure(data=traces, layout=layout)
-
-    return fig
-
-def create_gdp_bar_fig(year, continents):
-    mask = (df["Continent"].isin(continents) & (df["Year"] == year))
-    top_10 = df[mask].nlargest(10, 'GDP per capita (US$)')
-    top_10 = top_10.sort_values(by='GDP per capita (US$)', ascending=True)
-    top_10.reset_index(drop=True, inplace=True)
-    
-    gdp_levels = [5000, 20000, 40000, 70000]
-    levels_text = ['Low (5000)', 'Medium (20000)', 'High (40000)', 'Very High (70000)']
-    alpha_mapping = {
-        5000: 0.15,
-        20000: 0.3,
-        40000: 0.55,
-        70000: 0.8
+    while (live.inFlight !== null && change === live.changes) {
+        const waited = live.inFlight;
+        const stalled = await Promise.race([
+            new Promise(resolve => live.waiters.push(() => resolve(false))),
+            sleep(%(stall_ms)d).then(() => true),
+        ]);
+        if (stalled && live.inFlight === waited) {
+            live.inFlight = null;
+        }
     }
-    color_mapping = {
-        'Asia': '#648fff',
-        'Europe': '#785ef0',
-        'Africa': '#dc267f',
-        'North America':'#fe6100',
-        'South America': '#ffb000',
-        'Oceania': '#054fb9'
+    if (change !== live.changes) {
+        return [noUpdate, noUpdate];
     }
-    
-    def get_alpha(rate):
-        if rate <= 5000:
-            return alpha_mapping[5000]
-        elif rate <= 20000:
-            return alpha_mapping[20000]
-        elif rate <= 40000:
-            return alpha_mapping[40000]
-        elif rate <= 70000:
-            return alpha_mapping[70000]
-        else:
-            return 1
-    
-    def get_color(continent):
-        return color_mapping[continent]
-
-    top_10['alpha'] = top_10['GDP per capita (US$)'].apply(get_alpha)
-    top_10['color'] = top_10['Continent'].apply(get_color)
-    
-    shapes = []
-    annotations = []
-
-    for level, text in zip(gdp_levels, levels_text):
-        shapes.append(
-            dict(
-                type='line',
-                x0=level,
-                x1=level,
-                y0=-1,
-                y1=len(top_10),
-                line=dict(color='black', width=1)
-            )
-        )
-
-        annotations.append(
-            dict(
-                x=level-1500,
-                y=len(top_10) // 2 + 0.5,
-                text=text,
-                showarrow=False,
-                font=dict(size=12),
-                textangle=90
-            )
-        )
-
-    traces = []
-    legend_labels = set()
-
-    for i, row in top_10.iterrows():
-        alpha = row['alpha']
-        continent = row['Continent']
-
-        if continent not in legend_labels:
-            legend_labels.add(continent)
-            traces.append(go.Bar(
-                x=[None],
-                y=[None],
-                legendgroup=continent,
-                name=continent,
-                marker=dict(color=color_mapping[continent]),
-                showlegend=True
-            ))
-
-        traces.append(go.Bar(
-            x=[row['GDP per capita (US$)']],
-            y=[i],
-            orientation='h',
-            marker=dict(
-                color=row['color'],
-                opacity=alpha
-            ),
-            legendgroup=continent,
-            showlegend=False,
-            name=continent,
-            hovertemplate=f"Continent: {continent}<br>GDP per capita (US$): {row['GDP per capita (US$)']}<br>Country: {row['Country']}"
-        ))
-
-    layout = go.Layout(
-        title=dict(
-            text=f'Top 10 Countries by GDP per capita (US$) in {year}',
-            y=0.95
-        ),
-        xaxis=dict(title='GDP per capita (US$)', 
-                range=[0, df["GDP per capita (US$)"].max() * 1.1],
-                title_standoff=0),
-        yaxis=dict(title='Country', categoryorder='total ascending', tickvals=top_10.index, 
-                ticktext=top_10['Country'], title_standoff=0),
-        margin=dict(l=20, r=20, t=40, b=20),
-        font=dict(size=12),
-        xaxis_autorange=False,
-        yaxis_autorange=True,
-        legend=dict(title='Continent', traceorder='reversed', itemclick='toggleothers', itemdoubleclick='toggle'),
-        shapes=shapes,
-        annotations=annotations
-    )
-
-    fig = go.Figure(data=traces, layout=layout)
-
-    return fig
-
-app.layout = html.Div(
-    [
-        html.H2(children='Mortality rate based on oil consumption and GDP per capita'),
-        html.Div(style={'margin': '0px 0px -10px 0px'}),
-        
-        html.Div(
-            children=[
-                html.Div(dcc.Checklist(
-                    id="checklist",
-                    options=[
-                        {"label": continent, "value": continent} for continent in df["Continent"].unique()
-                    ],
-                    value=df["Continent"].unique().tolist(),
-                    inline=True,
-                    style={'display': 'inline-block'}
-                ), style={'display': 'inline-block', 'margin': '0px 20px 0px 0px'}),
-                
-                html.Div(dcc.Slider(
-                    id="year-slider",
-                    min=df["Year"].min(),
-                    max=df["Year"].max(),
-                    value=df["Year"].min(),
-                    marks={str(year-1): str(year-1) for year in years if year % 2 == 0},
-                    step=None,
-                ), style={'width': '60%', 'display': 'inline-block', 'margin': '0px 20px 0px 0px'}),
-                
-                html.Button("Play", id="play", style={'width': '5%', 'display': 'inline-block'}),
-            ],
-            style={'margin': '0px 0px'}
-        ),
-        
-        dcc.Interval(id="animate", interval=3000, disabled=True),
-        
-        dcc.Graph(id="graph-with-slider3", style={'height': '250px', 'margin': '10px 0px'}, figure=create_density_contour_fig(df["Year"].min(), df["Continent"].unique().tolist())),
-        
-        html.Div(
-            children=[
-                dcc.Graph(
-                    id="graph-with-slider", 
-                    style={'width': '48%', 'height': '275px', 'display': 'inline-block', 'margin': '0px', 'padding': '0px'}, 
-                    figure=create_mortality_bar_fig(df["Year"].min(), df["Continent"].unique().tolist())
-                ),
-                dcc.Graph(
-                    id="graph-with-slider2",
-                    style={'width': '48%', 'height': '275px', 'display': 'inline-block', 'margin': '0px', 'padding': '0px'}, 
-                    figure=create_oil_bar_fig(df["Year"].min(), df["Continent"].unique().tolist())
-                ),
-            ],
-            style={'margin': '10px 0px'}
-        ),
-        html.Div([
-            html.P('The proprietary of the data used in this dashboard is The World Bank (CC BY-4.0 license).'),
-        ])
+    live.inFlight = ++live.seq;
+    const request = {year: year, continents: continents, client: live.client, seq: live.seq};
+    return [request, ticked ? year : noUpdate];
+}
+"""
+
+ACKNOWLEDGE_RENDER_JS = """
+function(rendered) {
+    %(state)s
+    if (rendered && live.inFlight !== null && rendered.seq >= live.inFlight) {
+        live.inFlight = null;
+        wake();
+    }
+    return window.dash_clientside.no_update;
+}
+"""
+
+# Applies an update_figures delta to the three graphs, then records the state
+# they now show. Containers along each path are copied rather than changed in
+# place, so Dash sees new figure objects and redraws them.
+APPLY_FIGURE_DELTA_JS = """
+function(delta, ...figures) {
+    const noUpdate = window.dash_clientside.no_update;
+    if (delta.figures) {
+        return [...delta.figures, delta.state];
+    }
+    const updated = figures.map((figure, i) => {
+        if (!delta.ops[i].length) {
+            return noUpdate;
+        }
+        const root = {...figure};
+        for (const [paths, ...value] of delta.ops[i]) {
+            [].concat(paths).forEach((path, n) => {
+                const keys = path.split(".");
+                const last = keys.pop();
+                let target = root;
+                for (const key of keys) {
+                    target = target[key] = Array.isArray(target[key]) ? [...target[key]] : {...target[key]};
+                }
+                if (!value.length) {
+                    Array.isArray(target) ? target.splice(Number(last), 1) : delete target[last];
+                } else if (value.length === 2) {
+                    target[last] = target[last].slice(0, value[1]) + value[0];
+                } else {
+                    // Every path gets its own copy of a shared value, since
+                    // plotly.js may edit figure arrays such as ranges in place.
+                    target[last] = n ? JSON.parse(JSON.stringify(value[0])) : value[0];
+                }
+            });
+        }
+        return root;
+    });
+    return [...updated, delta.state];
+}
+"""
+
+# A request whose response never arrives stops blocking newer ones after this long.
+LIVE_STALL_MS = 10000
+
+def register_callbacks(app, animation_mode, debounce_ms=150):
+    figure_outputs = [
+        Output("graph-with-slider", "figure"),
+        Output("graph-with-slider2", "figure"),
+        Output("graph-with-slider3", "figure"),
     ]
-)
 
+    if animation_mode == "client":
+        # The browser steps the slider through the bundle, and any slider
+        # value, whether set by a tick or a drag, is drawn from the bundle
+        # without a request. Until the bundle arrives the graphs stay as
+        # they are.
+        app.clientside_callback(
+            """
+            function(n, selectedYear, bundle) {
+                if (!bundle) {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                const years = bundle.years;
+                return years[(years.indexOf(selectedYear) + 1) % years.length];
+            }
+            """,
+            Output("year-slider", "value"),
+            Input("animate", "n_intervals"),
+            State("year-slider", "value"),
+            State("figure-bundle", "data"),
+            prevent_initial_call=True,
+        )
+        app.clientside_callback(
+            """
+            function(year, bundle) {
+                const figures = bundle && bundle.figures[String(year)];
+                if (!figures) {
+                    throw window.dash_clientside.PreventUpdate;
+                }
+                return [figures[0], figures[1], figures[2]];
+            }
+            """,
+            *figure_outputs,
+            Input("year-slider", "value"),
+            Input("figure-bundle", "data"),
+            prevent_initial_call=True,
+        )
 
-@app.callback(
-    Output("graph-with-slider", "figure"),
-    Output("graph-with-slider2", "figure"),
-    Output("graph-with-slider3", "figure"),
-    Output("year-slider", "value"),
-    Input("animate", "n_intervals"),
-    State("year-slider", "value"),
-    State("checklist", "value"),
-    prevent_initial_call=True,
-)
-
-def update_figures(n, selected_year, continents):
-    index = years.index(selected_year)
-    index = (index + 1) % len(years)
-    year = years[index]
+        # Loaded with the page and again when the selection changes; a slider
+        # input here would cost a request per animation tick.
+        app.callback(
+            Output("figure-bundle", "data"),
+            Input("checklist", "value"),
+            Input("play", "n_clicks"),
+            State("figure-bundle", "data"),
+        )(instrumented("load_figure_bundle", load_figure_bundle))
+    else:
+        app.clientside_callback(
+            REQUEST_STATE_JS % {"state": LIVE_STATE_JS, "debounce_ms": debounce_ms, "stall_ms": LIVE_STALL_MS},
+            Output("requested-state", "data"),
+            Output("year-slider", "value"),
+            Input("animate", "n_intervals"),
+            Input("year-slider", "value"),
+            Input("checklist", "value"),
+            State("years", "data"),
+            prevent_initial_call=True,
+        )
+        app.clientside_callback(
+            ACKNOWLEDGE_RENDER_JS % {"state": LIVE_STATE_JS},
+            Output("render-ack", "data"),
+            Input("rendered-state", "data"),
+            prevent_initial_call=True,
+        )
+        app.callback(
+            Output("figure-delta", "data"),
+            Input("requested-state", "data"),
+            State("rendered-state", "data"),
+            prevent_initial_call=True,
+        )(instrumented("update_figures", update_figures))
+        app.clientside_callback(
+            APPLY_FIGURE_DELTA_JS,
+            *figure_outputs,
+            Output("rendered-state", "data"),
+            Input("figure-delta", "data"),
+            *[State(output.component_id, "figure") for output in figure_outputs],
+            prevent_initial_call=True,
+        )
 
-    return (
-        create_mortality_bar_fig(year, continents), 
-        create_oil_bar_fig(year, continents),
-        create_density_contour_fig(year, continents),
-        year
+    app.callback(
+        Output("range-graph", "figure"),
+        Input("year-range", "value"),
+        Input("checklist", "value"),
+        prevent_initial_call=True,
+    )(instrumented("update_range_figure", update_range_figure))
+
+    app.callback(
+        Output("country-graph", "figure"),
+        Input("graph-with-slider", "clickData"),
+        Input("graph-with-slider2", "clickData"),
+        prevent_initial_call=True,
+    )(instrumented("update_country_figure", update_country_figure))
+
+    app.callback(
+        Output("animate", "disabled"),
+        Input("play", "n_clicks"),
+        State("animate", "disabled"),
+    )(instrumented("toggle", toggle))
+
+def configure(config=None):
+    """Apply `config`, over default_config(), to the settings the figure
+    builders, caches and request hooks read, and return the merged config.
+
+    These settings are module globals shared by the whole process. Tools
+    that only build figures, such as export.py and the benchmarks, call this
+    instead of create_app().
+    """
+    global shared_store, profiler, data_reload_interval
+    config = {**default_config(), **(config or {})}
+
+    dataset.set_data_path(config["DATA_PATH"], mmap=config["DATA_MMAP"])
+    figures.density_grid_size = config["DENSITY_GRID_SIZE"]
+    if config["FIGURE_ENCODING"] not in ("plotly", "dict"):
+        raise ValueError(f"Unknown figure encoding: {config['FIGURE_ENCODING']!r}")
+    figures.figure_encoding = config["FIGURE_ENCODING"]
+    figures.events_path = config["EVENTS_PATH"]
+    figure_cache.maxsize = config["FIGURE_CACHE_SIZE"]
+    diff_cache.maxsize = config["FIGURE_CACHE_SIZE"]
+    store = config["FIGURE_STORE"]
+    shared_store = (
+        make_store(store, config["FIGURE_STORE_DIR"], config["FIGURE_STORE_MAX_ENTRIES"])
+        if isinstance(store, str) else store
     )
-
-
-@app.callback(
-    Output("animate", "disabled"),
-    Input("play", "n_clicks"),
-    State("animate", "disabled"),
-)
-def toggle(n, playing):
-    if n:
-        return not playing
-    return playing
+    metrics.enabled = config["METRICS"]
+    profiler = RequestProfiler(config["PROFILE_DIR"]) if config["PROFILE_REQUESTS"] else None
+    data_reload_interval = config["DATA_RELOAD_INTERVAL"]
+    return config
+
+created_app = None
+created_app_lock = threading.Lock()
+
+def create_app(config=None):
+    """Build the Dash app.
+
+    Only one app per process is supported: its settings and caches are the
+    module globals set by configure(), so a second app would silently
+    reconfigure the first. A second call raises RuntimeError instead.
+    """
+    global created_app
+    if created_app is not None:
+        raise RuntimeError("create_app() has already built this process's app; only one app per process is supported")
+    config = configure(config)
+
+    app = Dash(__name__)
+    # A layout function defers data loading and the initial figures to the
+    # first page load instead of import time.
+    app.validation_layout = validation_layout()
+    app.layout = serve_layout
+    register_callbacks(app, config["ANIMATION_MODE"], config["LIVE_DEBOUNCE_MS"])
+    app.server.route("/cache-stats")(cache_stats)
+    app.server.route("/figures/<int:year>")(serve_figures)
+    app.server.route("/metrics")(serve_metrics)
+    app.server.before_request(before_request)
+    app.server.after_request(after_request)
+    created_app = app
+
+    if config["PRELOAD_DATA"]:
+        get_dataset()
+    if config["FIGURE_CACHE_WARMUP"]:
+        # A preloading gunicorn master forks its workers as soon as this
+        # returns. A warm-up thread still running then could be forked while
+        # it holds a cache or metrics lock, deadlocking the worker, so there
+        # the warm-up finishes first and every worker inherits all of it.
+        warm_figure_cache(background=not config["PRELOAD_DATA"])
+    return app
+
+def create_server(config=None):
+    # The Flask server of a new app, for WSGI servers:
+    # gunicorn "dashboard:create_server()".
+    return create_app(config).server
+
+def __getattr__(name):
+    # dashboard.app and dashboard.server, as in gunicorn "dashboard:server",
+    # are this process's app, built from the environment on first access
+    # rather than at import.
+    if name not in ("app", "server"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with created_app_lock:
+        if created_app is None:
+            create_app()
+    return created_app if name == "app" else created_app.server
 
 if __name__ == '__main__':
-    app.run_server(debug=False)
+    create_app().run_server(debug=False)
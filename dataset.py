@@ -0,0 +1,526 @@
+import argparse
+import bisect
+import functools
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+oil_prod_10M_12M_barrels_day = ['United States', 'Saudi Arabia', 'Russia']
+oil_prod_1M_5M_barrels_day = [    
+    'Canada', 'China', 'Brazil', 'Iraq', 'Iran', 'Libya',
+    'United Arab Emirates', 'Kuwait', 'Kazakhstan', 'Angola',
+    'Mexico', 'Norway', 'Qatar', 'Oman', 'Nigeria', 'Algeria'
+]
+oil_prod_500k_1M_barrels_day = [
+    'Colombia', 'United Kingdom', 'Venezuela', 'Azerbaijan',
+    'Indonesia', 'India', 'Argentina', 'Egypt', 'Malaysia'
+]
+oil_prod_100k_500k_barrels_day = [
+    'Ecuador', 'Australia', 'Guyana', 'Congo, Rep.', 'Gabon',
+    'Turkmenistan', 'Bahrein', 'Ghana', 'Vietnam', 'South Sudan',
+    'Thailand', 'Equatorial Guinea',
+]
+oil_prod_10k_100k_barrels_day = [
+    'Syria', 'Italy', 'Brunei', 'Chad', 'Pakistan', 'Turkey',
+    'Sudan', 'Denmark', 'Romania', 'Cameroon', 'Trinidad and Tobago',
+    'Yemen', 'Peru', 'Papua New Guinea', 'Uzbekistan',
+    'Tunisia', 'Germany', 'Cuba', 'Belarus', 'Cote d\'Ivoire',
+    'Netherlands', 'Bolivia', 'Congo, Dem. Rep.', 'Hungary',
+    'Poland', 'Mongolia', 'Albania', 'Serbia', 'East Timor',
+    'Suriname', 'France', 'Croatia'
+]
+
+
+OIL_PRODUCER_TIERS = [
+    ('10M-12M barrels/day', oil_prod_10M_12M_barrels_day),
+    ('1M-5M barrels/day', oil_prod_1M_5M_barrels_day),
+    ('500k-1M barrels/day', oil_prod_500k_1M_barrels_day),
+    ('100k-500k barrels/day', oil_prod_100k_500k_barrels_day),
+    ('10k-100k barrels/day', oil_prod_10k_100k_barrels_day),
+]
+DEFAULT_OIL_PRODUCER_TIER = '<10k barrels/day'
+
+# A country listed in several tiers keeps the first (largest) one.
+tier_by_country = {
+    country: tier
+    for tier, countries in reversed(OIL_PRODUCER_TIERS)
+    for country in countries
+}
+
+def add_oil_producer_tiers(df):
+    tiers = [tier for tier, _ in OIL_PRODUCER_TIERS] + [DEFAULT_OIL_PRODUCER_TIER]
+    # On a categorical Country column the mapping runs once per distinct country.
+    df['Oil Producing Countries'] = pd.Categorical(
+        df['Country'].map(tier_by_country).astype(object).fillna(DEFAULT_OIL_PRODUCER_TIER),
+        categories=tiers,
+    )
+    return df
+
+DTYPES = {
+    'Country': 'category',
+    'Year': 'int16',
+    'Mortality Rate': 'float32',
+    'Oil Consumption per capita (tonnes per year)': 'float32',
+    'Population': 'int64',
+    'GDP per capita (US$)': 'float32',
+    'Continent': 'category',
+    'GDP per capita (log US$)': 'float32',
+}
+
+def load_csv(csv_path, typed=True):
+    df = pd.read_csv(csv_path, dtype=DTYPES if typed else None)
+    return add_oil_producer_tiers(df)
+
+def memory_report(csv_path):
+    before = pd.read_csv(csv_path)
+    before['Oil Producing Countries'] = before['Country'].map(tier_by_country).fillna(DEFAULT_OIL_PRODUCER_TIER)
+    after = load_csv(csv_path)
+    report = pd.DataFrame({
+        "before_bytes": before.memory_usage(deep=True, index=False),
+        "after_bytes": after.memory_usage(deep=True, index=False),
+        "before_dtype": before.dtypes.astype(str),
+        "after_dtype": after.dtypes.astype(str),
+    })
+    report.loc["total"] = [report["before_bytes"].sum(), report["after_bytes"].sum(), "", ""]
+    return report
+
+def columnar_path(csv_path):
+    return os.path.splitext(csv_path)[0] + ".columns"
+
+def source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {"source": os.path.basename(csv_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+# Bumped whenever the stored columns change, so older builds are not loaded.
+COLUMNAR_FORMAT_VERSION = 3
+
+def read_manifest(columns_dir):
+    try:
+        with open(os.path.join(columns_dir, "manifest.json")) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def build_columnar(csv_path, out_dir=None):
+    """Write the fully derived dataset as one .npy file per column.
+
+    String columns are dictionary encoded: the .npy holds integer codes and
+    the manifest holds the table of distinct values.
+
+    Running workers may have the current build memory-mapped, so a build
+    never writes to its files. It writes new files, named after the build,
+    and then replaces the manifest in one rename. Mapped files keep their
+    contents, and the files of the previous build are kept for readers that
+    read its manifest just before the swap. Older builds are removed.
+    """
+    out_dir = out_dir or columnar_path(csv_path)
+    os.makedirs(out_dir, exist_ok=True)
+    # Stored in IndexedDataset order, so a memory-mapped load needs no sort
+    # (which would copy every column into private memory).
+    df = load_csv(csv_path).sort_values(["Year", "Continent"], kind="stable")
+    build = f"{time.time_ns():x}-{os.getpid()}"
+
+    columns = []
+    for i, name in enumerate(df.columns):
+        file_name = f"{build}-{i}.npy"
+        if isinstance(df[name].dtype, pd.CategoricalDtype):
+            codes = df[name].cat.codes.to_numpy().astype(np.int32)
+            np.save(os.path.join(out_dir, file_name), codes)
+            columns.append({"name": name, "file": file_name, "categories": df[name].cat.categories.tolist()})
+        else:
+            np.save(os.path.join(out_dir, file_name), df[name].to_numpy())
+            columns.append({"name": name, "file": file_name})
+
+    manifest = {
+        "format_version": COLUMNAR_FORMAT_VERSION,
+        "build": build,
+        "columns": columns,
+        "rows": len(df),
+        **source_signature(csv_path),
+    }
+    previous = read_manifest(out_dir) or {}
+    # The manifest is swapped in last, so a half-built directory is never loaded.
+    tmp_path = os.path.join(out_dir, f".manifest-{build}.json")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(out_dir, "manifest.json"))
+
+    keep = {column["file"] for column in columns} | {column["file"] for column in previous.get("columns", [])}
+    for file_name in os.listdir(out_dir):
+        if file_name.endswith(".npy") and file_name not in keep:
+            # Unlinking leaves existing mappings of the file intact.
+            os.remove(os.path.join(out_dir, file_name))
+    return out_dir
+
+def load_columnar(columns_dir, mmap=False):
+    """Load a columnar build; with mmap the frame's columns are views of the
+    files, so every process mapping them shares the same physical pages."""
+    manifest = read_manifest(columns_dir)
+    if manifest is None:
+        raise FileNotFoundError(f"No columnar build in {columns_dir}")
+
+    data = {}
+    for column in manifest["columns"]:
+        values = np.load(os.path.join(columns_dir, column["file"]), mmap_mode="r" if mmap else None)
+        if "categories" in column:
+            values = pd.Categorical.from_codes(values, categories=column["categories"])
+        data[column["name"]] = values
+    return pd.DataFrame(data, copy=False)
+
+def columnar_is_fresh(csv_path, columns_dir):
+    manifest = read_manifest(columns_dir)
+    if manifest is None:
+        return False
+    if manifest.get("format_version") != COLUMNAR_FORMAT_VERSION:
+        return False
+    if not os.path.exists(csv_path):
+        return True
+    signature = source_signature(csv_path)
+    return all(manifest.get(key) == value for key, value in signature.items())
+
+def load_dataset(csv_path, prefer_columnar=True, mmap=False):
+    """Load the derived dataset, from the columnar build when it is up to date."""
+    columns_dir = columnar_path(csv_path)
+    if prefer_columnar and columnar_is_fresh(csv_path, columns_dir):
+        return load_columnar(columns_dir, mmap=mmap)
+    return load_csv(csv_path)
+
+@functools.lru_cache(maxsize=None)
+def load_event_table(path):
+    """Compile an events CSV into annotation text per (continent, year).
+
+    Each event covers Start Year to End Year inclusive (a single year when End
+    Year is empty), and every interval is kept even when names repeat.
+    """
+    events = pd.read_csv(path)
+    end_years = events['End Year'].fillna(events['Start Year']).astype(int)
+    names_by_key = {}
+    for continent, category, name, start, end in zip(
+        events['Continent'], events['Category'], events['Event'],
+        events['Start Year'].astype(int), end_years,
+    ):
+        for year in range(start, end + 1):
+            names_by_key.setdefault((continent, year), {}).setdefault(category, []).append(name)
+
+    return {
+        (continent, year): ''.join(
+            f'<b>{category} ({year}):</b><br>' + ''.join(f'{name}<br>' for name in names)
+            for category, names in categories.items()
+        )
+        for (continent, year), categories in names_by_key.items()
+    }
+
+METRIC_COLUMNS = [
+    'Mortality Rate',
+    'Oil Consumption per capita (tonnes per year)',
+    'GDP per capita (US$)',
+]
+
+# Metrics the bar charts can rank countries by.
+RANKED_METRICS = METRIC_COLUMNS + [
+    'Population',
+    'GDP per capita (log US$)',
+]
+
+# Longest top-n list kept per (year, continent, metric); longer requests
+# fall back to sorting the rows.
+TOP_K = 20
+
+def top_positions(values, k):
+    """Positions of the k largest values, largest first and ties in position
+    order, the order nlargest returns. NaN is never ranked."""
+    candidates = np.flatnonzero(~np.isnan(values))
+    if len(candidates) > k:
+        kth = np.partition(values[candidates], len(candidates) - k)[len(candidates) - k]
+        candidates = candidates[values[candidates] >= kth]
+    order = np.argsort(-values[candidates], kind="stable")
+    return candidates[order[:k]]
+
+def build_top_rows(df, row_index):
+    top_rows = {}
+    for metric in RANKED_METRICS:
+        column = df[metric].to_numpy(dtype=np.float64)
+        for key, (start, stop) in row_index.items():
+            positions = start + top_positions(column[start:stop], TOP_K)
+            # (-value, row) pairs sort the way the merge has to emit them.
+            top_rows[(*key, metric)] = list(zip((-column[positions]).tolist(), positions.tolist()))
+    return top_rows
+
+class CountryIndex:
+    """Every row ordered by (country, year), one array per ranked metric, so
+    a country's whole history is a slice of each array rather than a filter
+    over the frame."""
+
+    def __init__(self, df):
+        codes, countries = pd.factorize(df["Country"])
+        order = np.lexsort((df["Year"].to_numpy(), codes))
+        sorted_codes = codes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+        stops = np.r_[starts[1:], len(order)]
+        self.slices = {
+            str(countries[code]): (start, stop)
+            for code, start, stop in zip(sorted_codes[starts], starts.tolist(), stops.tolist())
+        }
+        self.years = df["Year"].to_numpy()[order]
+        self.columns = {metric: df[metric].to_numpy()[order] for metric in RANKED_METRICS}
+        first_rows = order[starts]
+        self.continent = dict(zip(self.slices, df["Continent"].to_numpy()[first_rows].astype(str)))
+        self.tier = dict(zip(self.slices, df["Oil Producing Countries"].to_numpy()[first_rows].astype(str)))
+
+    def history(self, country):
+        """Years and {metric: values} of one country, as views, oldest first."""
+        start, stop = self.slices[country]
+        return self.years[start:stop], {metric: values[start:stop] for metric, values in self.columns.items()}
+
+def build_row_index(df):
+    group_sizes = df.groupby(["Year", "Continent"], sort=False, observed=True).size()
+    stops = group_sizes.cumsum()
+    starts = stops - group_sizes
+    return {
+        (int(year), continent): (start, stop)
+        for (year, continent), start, stop in zip(group_sizes.index, starts, stops)
+    }
+
+def sorted_by_year_continent(df):
+    if not isinstance(df["Continent"].dtype, pd.CategoricalDtype):
+        return False
+    codes = df["Continent"].cat.codes.to_numpy().astype(np.int64)
+    keys = df["Year"].to_numpy().astype(np.int64) * (len(df["Continent"].cat.categories) + 1) + codes
+    return bool(np.all(keys[1:] >= keys[:-1]))
+
+def running_totals(matrix):
+    # Row i holds the sum of rows 0..i-1, so rows lo..hi-1 sum to totals[hi] - totals[lo].
+    totals = np.zeros((matrix.shape[0] + 1, matrix.shape[1]))
+    np.cumsum(matrix, axis=0, out=totals[1:])
+    return totals
+
+class YearRangeSums:
+    """Population-weighted running totals of each metric per country, one row
+    per year, so the average over any year range is a difference of two rows
+    instead of a groupby over every row in the range."""
+
+    def __init__(self, df, years, continents):
+        self.years = years
+        self.continents = continents
+        country_codes, self.countries = pd.factorize(df["Country"])
+        year_positions = np.searchsorted(years, df["Year"].to_numpy())
+        # Continent of each country, as a position in `continents`.
+        self.country_continent = np.zeros(len(self.countries), dtype=np.int64)
+        self.country_continent[country_codes] = pd.Index(continents).get_indexer(df["Continent"])
+
+        shape = (len(years), len(self.countries))
+        population = np.zeros(shape)
+        population[year_positions, country_codes] = df["Population"].to_numpy()
+        population_totals = running_totals(population)
+        self.weighted = {}
+        self.weights = {}
+        for metric in METRIC_COLUMNS:
+            values = np.full(shape, np.nan)
+            values[year_positions, country_codes] = df[metric].to_numpy()
+            present = ~np.isnan(values)
+            self.weighted[metric] = running_totals(np.where(present, values * population, 0))
+            self.weights[metric] = (
+                population_totals if present.all() else running_totals(np.where(present, population, 0))
+            )
+
+    def rows(self, start, end):
+        return bisect.bisect_left(self.years, start), bisect.bisect_right(self.years, end)
+
+    def continent_averages(self, metric, start, end):
+        """Averages over start..end inclusive, weighted by population in every
+        year, of each continent in `continents` order (NaN without data)."""
+        lo, hi = self.rows(start, end)
+        size = len(self.continents)
+        weighted = np.bincount(
+            self.country_continent, weights=self.weighted[metric][hi] - self.weighted[metric][lo], minlength=size,
+        )
+        weights = np.bincount(
+            self.country_continent, weights=self.weights[metric][hi] - self.weights[metric][lo], minlength=size,
+        )
+        return np.divide(weighted, weights, out=np.full(size, np.nan), where=weights > 0)
+
+class IndexedDataset:
+    """The derived frame plus the lookups shared by every figure builder."""
+
+    def __init__(self, df):
+        # Rows are sorted once by (Year, Continent) so every group is a contiguous
+        # slice and a filter costs time proportional to the rows it returns.
+        if not sorted_by_year_continent(df):
+            df = df.sort_values(["Year", "Continent"], kind="stable").reset_index(drop=True)
+        self.df = df
+        self.years = sorted(set(int(year) for year in self.df["Year"] if year % 1 == 0))
+        self.continents = self.df["Continent"].unique().tolist()
+        self.row_index = build_row_index(self.df)
+        self.metric_max = {metric: self.df[metric].max() for metric in RANKED_METRICS}
+        self.top_rows = build_top_rows(self.df, self.row_index)
+        self.countries = CountryIndex(self.df)
+        self.range_sums = YearRangeSums(self.df, self.years, self.continents)
+        # Content hash of the frame, so anything derived from it can be
+        # addressed by what the data is rather than where it came from.
+        row_hashes = pd.util.hash_pandas_object(self.df, index=False).to_numpy()
+        self.version = hashlib.sha256(row_hashes.tobytes()).hexdigest()[:16]
+        # The same per (year, continent) group, plus a hash of what every
+        # figure depends on besides its own groups (the bar charts' axis
+        # ranges), so a reload can tell which states changed.
+        self.group_versions = {
+            key: hashlib.sha256(row_hashes[start:stop].tobytes()).hexdigest()[:16]
+            for key, (start, stop) in self.row_index.items()
+        }
+        self.shared_version = hashlib.sha256(
+            repr([(metric, float(value)) for metric, value in self.metric_max.items()]).encode()
+        ).hexdigest()[:16]
+
+    def select_rows(self, year, continents):
+        slices = [self.row_index[(year, c)] for c in continents if (year, c) in self.row_index]
+        if not slices:
+            return self.df.iloc[0:0]
+        positions = np.concatenate([np.arange(start, stop) for start, stop in slices])
+        return self.df.iloc[positions]
+
+    def state_version(self, year, continents):
+        """Content hash of everything the figures of one state are built from."""
+        parts = [self.shared_version, *(self.group_versions.get((year, c), "") for c in continents)]
+        return hashlib.sha256(":".join(parts).encode()).hexdigest()[:16]
+
+    def changed_groups(self, other):
+        """The (year, continent) groups whose rows differ in `other`, or None
+        when something all figures depend on changed."""
+        if other.shared_version != self.shared_version or other.continents != self.continents:
+            return None
+        return {
+            key for key in self.group_versions.keys() | other.group_versions.keys()
+            if self.group_versions.get(key) != other.group_versions.get(key)
+        }
+
+    def top_n(self, year, continents, metric, n):
+        """The n rows with the largest `metric` among `continents` in `year`,
+        largest first, as nlargest would return them."""
+        if n > TOP_K:
+            return self.select_rows(year, continents).nlargest(n, metric)
+        lists = [self.top_rows[(year, c, metric)] for c in continents if (year, c, metric) in self.top_rows]
+        positions = [position for _, position in itertools.islice(heapq.merge(*lists), n)]
+        return self.df.iloc[positions]
+
+# The dataset is loaded on first use rather than at import, so importing the
+# app (workers, tests, tooling) stays cheap until data is actually needed.
+data_path = "oil_consumption_mortality.csv"
+data_mmap = False
+_active_dataset = None
+_active_lock = threading.Lock()
+# Size and mtime of the data file when the active dataset was read from it.
+_active_signature = None
+_reload_lock = threading.Lock()
+
+def set_data_path(path, mmap=False):
+    global data_path, data_mmap, _active_dataset, _active_signature
+    with _active_lock:
+        if (path, mmap) != (data_path, data_mmap):
+            data_path = path
+            data_mmap = mmap
+            _active_dataset = None
+            _active_signature = None
+
+def current_signature():
+    try:
+        return source_signature(data_path)
+    except FileNotFoundError:
+        return None
+
+def get_dataset():
+    global _active_dataset, _active_signature
+    dataset = _active_dataset
+    if dataset is None:
+        with _active_lock:
+            if _active_dataset is None:
+                # Taken before reading, so a write during the load is picked
+                # up by the next reload check.
+                _active_signature = current_signature()
+                _active_dataset = IndexedDataset(load_dataset(data_path, mmap=data_mmap))
+            dataset = _active_dataset
+    return dataset
+
+def reload_if_changed():
+    """Read the data file again if its size or mtime changed and swap the
+    new dataset in. Returns (old, new) when the content changed, else None.
+
+    The load and indexing happen on the calling thread without holding the
+    lock get_dataset() takes, so requests keep using the old dataset until
+    the swap, which is a single assignment.
+    """
+    global _active_dataset, _active_signature
+    with _reload_lock:
+        old = _active_dataset
+        signature = current_signature()
+        if old is None or signature is None or signature == _active_signature:
+            return None
+        new = IndexedDataset(load_dataset(data_path, mmap=data_mmap))
+        with _active_lock:
+            if _active_dataset is not old:
+                # set_data_path() got there first.
+                return None
+            _active_signature = signature
+            if new.version == old.version:
+                return None
+            _active_dataset = new
+        return old, new
+
+def measure_load(csv_path, fmt):
+    start = time.perf_counter()
+    if fmt == "columnar":
+        df = load_columnar(columnar_path(csv_path))
+    else:
+        df = load_csv(csv_path)
+    elapsed = time.perf_counter() - start
+    return {
+        "format": fmt,
+        "load_seconds": round(elapsed, 4),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "frame_mb": round(df.memory_usage(deep=True).sum() / 1024 ** 2, 2),
+    }
+
+def report(csv_path):
+    # Each format is loaded in a fresh interpreter so RSS and imports are comparable.
+    results = []
+    for fmt in ("csv", "columnar"):
+        code = (
+            "import json, dataset; "
+            f"print(json.dumps(dataset.measure_load({csv_path!r}, {fmt!r})))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout
+        results.append(json.loads(output))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect the dashboard dataset.")
+    parser.add_argument("command", choices=["build", "report", "memory"])
+    parser.add_argument("--csv", default="oil_consumption_mortality.csv")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        print(f"Wrote {build_columnar(args.csv)}")
+    elif args.command == "memory":
+        print(memory_report(args.csv).to_string())
+    else:
+        if not columnar_is_fresh(args.csv, columnar_path(args.csv)):
+            build_columnar(args.csv)
+        for result in report(args.csv):
+            print(
+                f"{result['format']:>8}: {result['load_seconds']:.4f} s, "
+                f"peak RSS {result['peak_rss_mb']} MB, frame {result['frame_mb']} MB"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.offline
+
+import dashboard
+import figures
+from dataset import get_dataset
+from figures import create_gdp_bar_fig
+
+# The three figures of the dashboard plus the GDP bar chart, which the app
+# itself does not show.
+EXPORT_FIGURES = ["mortality_bar", "oil_bar", "density_contour", "gdp_bar"]
+
+SELECTIONS = {
+    "every": lambda continents: [
+        list(selection)
+        for size in range(1, len(continents) + 1)
+        for selection in itertools.combinations(continents, size)
+    ],
+    "single": lambda continents: [[continent] for continent in continents] + [list(continents)],
+    "all": lambda continents: [list(continents)],
+}
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Mortality rate, oil consumption and GDP per capita in %(year)s</title>
+<script src="../../plotly.min.js"></script>
+</head>
+<body>
+<h2>Mortality rate based on oil consumption and GDP per capita</h2>
+<p>%(continents)s:
+<a href="%(previous)s.html">%(previous)s</a> | <b>%(year)s</b> | <a href="%(next)s.html">%(next)s</a> |
+<a href="%(next)s.html#play">Play</a></p>
+<div id="density_contour" style="height: 250px"></div>
+<div id="mortality_bar" style="width: 48%%; height: 275px; display: inline-block"></div>
+<div id="oil_bar" style="width: 48%%; height: 275px; display: inline-block"></div>
+<div id="gdp_bar" style="height: 275px"></div>
+<p>The proprietary of the data used in this dashboard is The World Bank (CC BY-4.0 license).</p>
+<script>
+const figures = %(figures)s;
+for (const [id, figure] of Object.entries(figures)) {
+    Plotly.newPlot(id, figure.data, figure.layout);
+}
+if (location.hash === "#play") {
+    setTimeout(() => { location.href = "%(next)s.html#play"; }, 3000);
+}
+</script>
+</body>
+</html>
+"""
+
+def selection_path(continents):
+    return "+".join(continent.lower().replace(" ", "-") for continent in continents)
+
+def build_gdp_bar(year, continents):
+    if figures.figure_encoding != "plotly":
+        return figures.create_bar_dict("gdp_bar", year, continents)
+    return json.loads(create_gdp_bar_fig(year, continents).to_json())
+
+def write_file(path, payload):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(payload)
+    return len(payload)
+
+def export_selection(out_dir, continents, years, html):
+    """Write every year of one continent selection. Returns the number of
+    bytes written and the CPU seconds spent."""
+    start = time.process_time()
+    path = selection_path(continents)
+    written = 0
+    for i, year in enumerate(years):
+        mortality_bar, oil_bar, density_contour = dashboard.build_figures(year, continents)
+        state = dict(zip(EXPORT_FIGURES, [mortality_bar, oil_bar, density_contour, build_gdp_bar(year, continents)]))
+        payload = dashboard.dumps(state)
+        written += write_file(os.path.join(out_dir, "figures", path, f"{year}.json"), payload)
+        if html:
+            page = PAGE % {
+                "year": year,
+                "continents": ", ".join(continents),
+                "previous": years[i - 1],
+                "next": years[(i + 1) % len(years)],
+                # A "</script>" inside a string would end the script element.
+                "figures": payload.decode().replace("</", "<\\/"),
+            }
+            written += write_file(os.path.join(out_dir, "html", path, f"{year}.html"), page.encode())
+    return written, time.process_time() - start
+
+def export(out_dir, workers=1, selections="every", years=None, html=True, config=None):
+    """Write the states of `selections` under out_dir. `config`, as passed
+    to dashboard.configure(), is applied again in every worker process."""
+    # Loaded before the pool starts, so forked workers share the dataset.
+    data = get_dataset()
+    years = [year for year in data.years if years is None or year in years]
+    chosen = SELECTIONS[selections](data.continents)
+
+    start = time.perf_counter()
+    arguments = (itertools.repeat(out_dir), chosen, itertools.repeat(years), itertools.repeat(html))
+    if workers > 1:
+        # Workers started with spawn rather than fork don't inherit what
+        # dashboard.configure() set, so each one applies the config itself.
+        with ProcessPoolExecutor(workers, initializer=dashboard.configure, initargs=(config,)) as pool:
+            results = list(pool.map(export_selection, *arguments))
+    else:
+        results = list(map(export_selection, *arguments))
+    elapsed = time.perf_counter() - start
+
+    written = sum(size for size, _ in results)
+    if html:
+        written += write_file(os.path.join(out_dir, "plotly.min.js"), plotly.offline.get_plotlyjs().encode())
+    manifest = {
+        "figure_version": dashboard.figure_version(),
+        "data_version": data.version,
+        "figures": EXPORT_FIGURES,
+        "years": years,
+        "continents": data.continents,
+        "selections": [{"continents": continents, "path": selection_path(continents)} for continents in chosen],
+        "json": "figures/{path}/{year}.json",
+        "html": "html/{path}/{year}.html" if html else None,
+    }
+    write_file(os.path.join(out_dir, "manifest.json"), json.dumps(manifest, indent=1).encode())
+    return {
+        "states": len(chosen) * len(years),
+        "bytes": written,
+        "seconds": elapsed,
+        "cpu_seconds": sum(seconds for _, seconds in results),
+        "workers": workers,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Export every dashboard state as static JSON and HTML files."
+    )
+    parser.add_argument("--out", default="export")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes the continent selections are spread over")
+    parser.add_argument("--selections", choices=sorted(SELECTIONS), default="every",
+                        help="every combination of continents, each continent alone plus all, or only all")
+    parser.add_argument("--years", type=int, nargs="+", help="only these years (default: all)")
+    parser.add_argument("--no-html", dest="html", action="store_false", help="only write the JSON files")
+    args = parser.parse_args(argv)
+    # The same settings as the app, without building one.
+    config = dashboard.configure()
+
+    result = export(args.out, args.workers, args.selections, args.years, args.html, config)
+    print(
+        f"{result['states']} states, {result['bytes'] / 1024 ** 2:.1f} MB in {result['seconds']:.1f} s "
+        f"({result['workers']} processes): {result['states'] / result['seconds']:.1f} states/s, "
+        f"{result['seconds'] * 1000 / result['states']:.1f} ms per state"
+    )
+    # The workers' CPU time is roughly what one process would have needed,
+    # so its ratio to the wall time is the speedup the pool achieved.
+    print(
+        f"CPU {result['cpu_seconds']:.1f} s, speedup {result['cpu_seconds'] / result['seconds']:.2f}x, "
+        f"efficiency {result['cpu_seconds'] / result['seconds'] / result['workers']:.0%} per process"
+    )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class FigureCache:
+    """Bounded LRU cache of built figures keyed by (year, continent set), plus
+    whatever else the caller needs in the key."""
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(year, continents):
+        return (int(year), frozenset(continents))
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_build(self, key, build):
+        value = self.get(key)
+        if value is None:
+            # Built outside the lock so concurrent misses don't serialize.
+            value = build()
+            self.put(key, value)
+        return value
+
+    def warm(self, keys, build, background=True):
+        # keys may be a callable so that computing them (and loading whatever
+        # data they need) also happens off the calling thread.
+        def run():
+            for key in (keys() if callable(keys) else keys):
+                with self._lock:
+                    if key in self._entries:
+                        continue
+                self.put(key, build(key))
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name="figure-cache-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, predicate):
+        """Drop the entries whose key matches; returns how many there were."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class LocalStore:
+    """In-process stand-in for a Redis-like server: get/set/delete of bytes."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._values.get(key)
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+
+class FileSystemStore:
+    """Values stored as files in one directory, shared by every worker on the
+    host and kept across restarts. Same interface as LocalStore.
+
+    Keys that are no longer looked up, such as those of data that has since
+    been reloaded, are never overwritten, so the directory is pruned to the
+    `max_entries` most recently written files (0 keeps them all). The prune
+    runs every max_entries / 10 writes, so the directory can exceed the bound
+    by that much in between.
+    """
+
+    def __init__(self, directory, max_entries=0):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        # Written under a unique name then renamed, so readers in other
+        # processes never see a partial file.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+        if self.max_entries > 0:
+            with self._lock:
+                self._writes += 1
+                due = self._writes >= max(1, self.max_entries // 10)
+                if due:
+                    self._writes = 0
+            if due:
+                self.prune()
+
+    def prune(self):
+        """Remove the oldest files beyond max_entries; returns how many."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                # Files still being written by another process are skipped.
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    files.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        files.sort()
+        removed = 0
+        for _, path in files[:max(0, len(files) - self.max_entries)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                # Pruned by another worker.
+                pass
+        return removed
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+def make_store(kind, directory=None, max_entries=0):
+    if kind == "local":
+        return LocalStore()
+    if kind == "filesystem":
+        return FileSystemStore(directory, max_entries)
+    if kind in (None, "", "none"):
+        return None
+    raise ValueError(f"Unknown figure store: {kind!r}")
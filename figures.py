@@ -0,0 +1,516 @@
+import functools
+import json
+
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from dataset import get_dataset, load_event_table
+from metrics import PhaseTimer, timed
+
+# With a positive grid size the density plot averages mortality over a
+# GDP x oil consumption grid on the server and ships only the z-matrix,
+# instead of sending every row for the browser to bin.
+density_grid_size = 0
+
+events_path = "events.csv"
+
+# "plotly" validates each figure as graph objects before it is shipped.
+# "dict" ships the dicts as built.
+figure_encoding = "plotly"
+
+def display_values(values):
+    # float32 columns are widened through their shortest decimal form, so a
+    # figure shows 90.1 rather than 90.0999984741211.
+    values = np.asarray(values)
+    if values.dtype == np.float32:
+        return values.astype(str).astype(np.float64)
+    return values
+
+def binned_average_grid(x, y, z, x_range, y_range, size):
+    bins = [size, size]
+    extent = [x_range, y_range]
+    sums, x_edges, y_edges = np.histogram2d(x, y, bins=bins, range=extent, weights=z)
+    counts, _, _ = np.histogram2d(x, y, bins=bins, range=extent)
+    # Empty bins average to 0, as they do when the browser bins with histfunc="avg".
+    averages = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    x_centers = (x_edges[:-1] + x_edges[1:]) / 2
+    y_centers = (y_edges[:-1] + y_edges[1:]) / 2
+    # histogram2d indexes by [x, y]; contour z is indexed by [y, x].
+    return x_centers, y_centers, averages.T
+
+MORTALITY_LEVELS = [50, 100, 200, 400]
+MORTALITY_LEVELS_TEXT = ['Low (50)', 'Medium (100)', 'High (200)', 'Very High (400)']
+
+DENSITY_CONTOUR_STYLE = dict(
+    colorscale=['#648fff', '#785ef0', '#dc267f', '#fe6100', '#ffb000'],
+    autocontour=False,
+    contours_coloring="fill",
+    line=dict(width=1),
+    hovertemplate="Mortality Rate: %{z}<br>Oil Consumption: %{y}<br>GDP per capita: %{x}<extra></extra>",
+    showscale=True,
+    contours=dict(
+        start=min(MORTALITY_LEVELS),
+        end=max(MORTALITY_LEVELS),
+        size=(max(MORTALITY_LEVELS) - min(MORTALITY_LEVELS)) / len(MORTALITY_LEVELS),
+    ),
+    colorbar=dict(
+        title="Mortality Rate (per 1000 births)",
+        tickvals=MORTALITY_LEVELS,
+        ticktext=MORTALITY_LEVELS_TEXT,
+    ),
+)
+
+SUBPLOT_OPTIONS = dict(shared_xaxes=False, shared_yaxes=False, horizontal_spacing=0.05)
+
+def density_ranges(filtered_df):
+    x_range = [
+        0,
+        display_values(filtered_df["GDP per capita (US$)"].max()) + 1000
+    ]
+
+    y_range = [
+        0,
+        display_values(filtered_df["Oil Consumption per capita (tonnes per year)"].max()) + 5
+    ]
+    return x_range, y_range
+
+def density_points(continent_df, x_range, y_range):
+    """x, y, z of one subplot: the averaged grid when density_grid_size is
+    set, otherwise the raw rows for the browser to bin."""
+    if density_grid_size > 0:
+        return binned_average_grid(
+            continent_df["GDP per capita (US$)"].to_numpy(),
+            continent_df["Oil Consumption per capita (tonnes per year)"].to_numpy(),
+            continent_df["Mortality Rate"].to_numpy(),
+            x_range, y_range, density_grid_size,
+        )
+    return (
+        display_values(continent_df["GDP per capita (US$)"]),
+        display_values(continent_df["Oil Consumption per capita (tonnes per year)"]),
+        display_values(continent_df["Mortality Rate"]),
+    )
+
+def event_annotation(x_range, y_range, text):
+    return dict(
+        x=x_range[1] - 0.4 * (x_range[1] - x_range[0]),
+        y=y_range[1] - 0.5 * (y_range[1] - y_range[0]),
+        text=text,
+        showarrow=False,
+        font=dict(size=10, color='black'),
+        align='left',
+        bordercolor='black',
+        borderwidth=1,
+    )
+
+continent_colors = {
+    'Asia': '#648fff',
+    'Europe': '#785ef0',
+    'Africa': '#dc267f',
+    'North America':'#fe6100',
+    'South America': '#ffb000',
+    'Oceania': '#054fb9'
+}
+
+def select_top_n(timer, year, continents, metric, n):
+    with timer.phase("top_n"):
+        return get_dataset().top_n(year, continents, metric, n).iloc[::-1]
+
+def top_n_bar_series(top_n, continents, metric, levels, alphas, hover_label, hover_columns):
+    """Per-continent bar data: (continent, rows mask) pairs plus the arrays
+    and hover template shared by every trace."""
+    values = display_values(top_n[metric])
+    positions = np.arange(len(top_n))
+
+    # Bars up to each level get its alpha, anything above the last one is opaque.
+    opacity = np.append(alphas, 1.0)[np.searchsorted(levels, values, side='left')]
+    row_continents = top_n["Continent"].to_numpy()
+    customdata = top_n[["Country", *[column for _, column in hover_columns]]].to_numpy()
+
+    # The continent is the trace's name, so traces of different continents
+    # share one template and an animation tick that moves bars between them
+    # need not resend it.
+    hovertemplate = f"Continent: %{{fullData.name}}<br>{hover_label}: %{{x}}<br>Country: %{{customdata[0]}}"
+    for i, (label, _) in enumerate(hover_columns, start=1):
+        hovertemplate += f"<br>{label}: %{{customdata[{i}]}}"
+
+    # Traces follow the selection's order, so from one year to the next a
+    # trace keeps its continent unless a continent enters or leaves the top n.
+    present = set(row_continents)
+    groups = [(continent, row_continents == continent) for continent in continents if continent in present]
+    return groups, values, positions, opacity, customdata, hovertemplate
+
+def level_markers(levels, levels_text, label_offset, count):
+    shapes = [
+        dict(
+            type='line',
+            x0=level,
+            x1=level,
+            y0=-1,
+            y1=count,
+            line=dict(color='black', width=1)
+        )
+        for level in levels
+    ]
+    annotations = [
+        dict(
+            x=level - label_offset,
+            y=count // 2 + 0.5,
+            text=text,
+            showarrow=False,
+            font=dict(size=12),
+            textangle=90
+        )
+        for level, text in zip(levels, levels_text)
+    ]
+    return shapes, annotations
+
+BAR_FIGURES = {
+    "mortality_bar": dict(
+        metric='Mortality Rate',
+        levels=[50, 100, 200, 400],
+        levels_text=['Low (50)', 'Medium (100)', 'High (200)', 'Very High (400)'],
+        alphas=[0.15, 0.3, 0.55, 0.8],
+        label_offset=20,
+        title='Top {n} Countries by Mortality Rate in {year}',
+        xaxis_title='Mortality Rate (per 1000 births)',
+        hover_label='Mortality Rate',
+        margin_top=30,
+    ),
+    "oil_bar": dict(
+        metric='Oil Consumption per capita (tonnes per year)',
+        levels=[2, 4, 7.5, 10],
+        levels_text=['Low (2)', 'Medium (4)', 'High (7.5)', 'Very High (10)'],
+        alphas=[0.15, 0.3, 0.55, 0.8],
+        label_offset=0.5,
+        title='Top {n} Countries by Oil Consumption<br>per capita (tonnes per year) in {year}',
+        xaxis_title='Oil Consumption per<br>capita (tonnes per year)',
+        hover_label='Oil Consumption per capita',
+        hover_columns=[('Oil Production', 'Oil Producing Countries')],
+        margin_top=50,
+        title_y=0.95,
+    ),
+    "gdp_bar": dict(
+        metric='GDP per capita (US$)',
+        levels=[5000, 20000, 40000, 70000],
+        levels_text=['Low (5000)', 'Medium (20000)', 'High (40000)', 'Very High (70000)'],
+        alphas=[0.15, 0.3, 0.55, 0.8],
+        label_offset=1500,
+        title='Top {n} Countries by GDP per capita (US$) in {year}',
+        xaxis_title='GDP per capita (US$)',
+        hover_label='GDP per capita (US$)',
+        margin_top=40,
+        title_y=0.95,
+    ),
+}
+
+RANGE_METRICS = [
+    ('Mortality Rate', 'Mortality Rate (per 1000 births)'),
+    ('Oil Consumption per capita (tonnes per year)', 'Oil Consumption per capita (tonnes per year)'),
+    ('GDP per capita (US$)', 'GDP per capita (US$)'),
+]
+
+def range_series(timer, start, end, continents):
+    """Per metric, the population-weighted average of each continent over
+    start..end and its change from start to end, in `continents` order."""
+    range_sums = get_dataset().range_sums
+    with timer.phase("aggregate"):
+        positions = [range_sums.continents.index(continent) for continent in continents]
+        series = []
+        for metric, _ in RANGE_METRICS:
+            averages = range_sums.continent_averages(metric, start, end)[positions]
+            changes = (
+                range_sums.continent_averages(metric, end, end) - range_sums.continent_averages(metric, start, start)
+            )[positions]
+            series.append((averages, changes))
+    return series
+
+def range_title(start, end):
+    return f'Population-weighted averages {start}-{end} (top) and change from {start} to {end} (bottom)'
+
+RANGE_HOVERTEMPLATE = "Continent: %{x}<br>%{meta}: %{y:,.2f}<extra></extra>"
+
+# make_subplots alone takes most of a range drag's time budget, so the grid
+# is laid out once and reused.
+@functools.lru_cache(maxsize=None)
+def range_subplot_layout():
+    layout = json.loads(make_subplots(
+        rows=2, cols=len(RANGE_METRICS), subplot_titles=[title for _, title in RANGE_METRICS],
+        vertical_spacing=0.12, horizontal_spacing=0.06,
+    ).to_json())["layout"]
+    del layout["template"]
+    return layout
+
+HISTORY_METRICS = [
+    ('Mortality Rate', 'Mortality Rate'),
+    ('Oil Consumption per capita (tonnes per year)', 'Oil Consumption per capita'),
+    ('GDP per capita (US$)', 'GDP per capita (US$)'),
+    ('GDP per capita (log US$)', 'GDP per capita (log US$)'),
+    ('Population', 'Population'),
+]
+
+def history_title(country, continent, tier):
+    # Plotly reads "<" in text as the start of a tag, as in "<10k barrels/day".
+    return f'{country} ({continent}), oil production {tier.replace("<", "&lt;")}'
+
+HISTORY_HOVERTEMPLATE = "%{x}: %{y}<extra></extra>"
+
+@functools.lru_cache(maxsize=None)
+def history_subplot_layout():
+    layout = json.loads(make_subplots(
+        rows=1, cols=len(HISTORY_METRICS), subplot_titles=[title for _, title in HISTORY_METRICS],
+        horizontal_spacing=0.05,
+    ).to_json())["layout"]
+    del layout["template"]
+    return layout
+
+# Every figure is built as a plain dict, the form it is cached and shipped
+# in, without creating graph objects. That skips Plotly's per-property
+# validation and the to_json/loads round trip. The create_*_fig functions at
+# the end wrap the same dicts in graph objects.
+
+@functools.lru_cache(maxsize=None)
+def default_template():
+    # The template go.Figure attaches to every figure. Shared, never mutated.
+    return json.loads(go.Figure().to_json())["layout"]["template"]
+
+@functools.lru_cache(maxsize=64)
+def subplot_layout(continents):
+    layout = json.loads(
+        make_subplots(rows=1, cols=len(continents), subplot_titles=continents, **SUBPLOT_OPTIONS).to_json()
+    )["layout"]
+    del layout["template"]
+    return layout
+
+@functools.lru_cache(maxsize=None)
+def density_trace_style(trace_type):
+    trace_class = go.Contour if trace_type == "contour" else go.Histogram2dContour
+    return json.loads(go.Figure(trace_class(**DENSITY_CONTOUR_STYLE)).to_json())["data"][0]
+
+def subplot_suffix(i):
+    return "" if i == 1 else str(i)
+
+def create_density_contour_dict(year, continents):
+    timer = PhaseTimer("density_contour")
+    data = get_dataset()
+    with timer.phase("filter"):
+        filtered_df = data.select_rows(year, continents)
+    x_range, y_range = density_ranges(filtered_df)
+    x_range, y_range = [0, float(x_range[1])], [0, float(y_range[1])]
+
+    with timer.phase("layout"):
+        skeleton = subplot_layout(tuple(continents))
+        layout = {
+            "annotations": list(skeleton["annotations"]),
+            "margin": {"l": 20, "r": 20, "t": 50, "b": 20},
+            "font": {"size": 12},
+            "coloraxis": {"showscale": False},
+            "title": {"text": f'Mortality Rate vs Oil Consumption and GDP per capita in {year}'},
+            "template": default_template(),
+        }
+
+    traces = []
+    trace_type = "contour" if density_grid_size > 0 else "histogram2dcontour"
+    for i, continent in enumerate(continents, start=1):
+        with timer.phase("filter"):
+            continent_df = data.select_rows(year, [continent])
+
+        suffix = subplot_suffix(i)
+        with timer.phase("traces"):
+            x, y, z = density_points(continent_df, x_range, y_range)
+            trace = {
+                **density_trace_style(trace_type),
+                "x": x.tolist(),
+                "y": y.tolist(),
+                "z": z.tolist(),
+                "xaxis": f"x{suffix}",
+                "yaxis": f"y{suffix}",
+            }
+            if trace_type == "histogram2dcontour":
+                trace["histfunc"] = "avg"
+            traces.append(trace)
+
+        with timer.phase("layout"):
+            layout[f"xaxis{suffix}"] = {
+                **skeleton[f"xaxis{suffix}"],
+                "title": {"font": {"size": 14}, "text": "GDP per capita (US$)", "standoff": 5},
+                "range": x_range,
+            }
+            layout[f"yaxis{suffix}"] = {
+                **skeleton[f"yaxis{suffix}"],
+                "title": {"font": {"size": 14}, "text": "Oil Consumption per<br>capita (tonnes per year)", "standoff": 0},
+                "range": y_range,
+            }
+            annotation_text = load_event_table(events_path).get((continent, year))
+            if annotation_text:
+                layout["annotations"].append({
+                    **event_annotation(x_range, y_range, annotation_text),
+                    "xref": f"x{suffix}",
+                    "yref": f"y{suffix}",
+                })
+
+    timer.record()
+    return {"data": traces, "layout": layout}
+
+def create_top_n_bar_dict(year, continents, metric, levels, levels_text, alphas,
+                          label_offset, title, xaxis_title, hover_label,
+                          margin_top, title_y=None, hover_columns=(), n=10, name="top_n_bar"):
+    timer = PhaseTimer(name)
+    data = get_dataset()
+    top_n = select_top_n(timer, year, continents, metric, n)
+
+    with timer.phase("traces"):
+        groups, values, positions, opacity, customdata, hovertemplate = top_n_bar_series(
+            top_n, continents, metric, levels, alphas, hover_label, hover_columns,
+        )
+        traces = [
+            {
+                "customdata": customdata[rows].tolist(),
+                "hovertemplate": hovertemplate,
+                "legendgroup": continent,
+                "marker": {"color": continent_colors[continent], "opacity": opacity[rows].tolist()},
+                "name": continent,
+                "orientation": "h",
+                "x": values[rows].tolist(),
+                "y": positions[rows].tolist(),
+                "type": "bar",
+            }
+            for continent, rows in groups
+        ]
+
+    with timer.phase("layout"):
+        shapes, annotations = level_markers(levels, levels_text, label_offset, len(top_n))
+        title_layout = {"text": title.format(n=n, year=year)}
+        if title_y is not None:
+            title_layout["y"] = title_y
+        layout = {
+            "annotations": annotations,
+            "font": {"size": 12},
+            "legend": {
+                "itemclick": "toggleothers", "itemdoubleclick": "toggle",
+                "title": {"text": "Continent"}, "traceorder": "reversed",
+            },
+            "margin": {"b": 20, "l": 20, "r": 20, "t": margin_top},
+            "shapes": shapes,
+            "title": title_layout,
+            "xaxis": {
+                "autorange": False,
+                "range": [0, float(display_values(data.metric_max[metric]) * 1.1)],
+                "title": {"standoff": 0, "text": xaxis_title},
+            },
+            "yaxis": {
+                "autorange": True,
+                "categoryorder": "total ascending",
+                "ticktext": top_n["Country"].astype(str).tolist(),
+                "tickvals": positions.tolist(),
+                "title": {"standoff": 0, "text": "Country"},
+            },
+            "template": default_template(),
+        }
+
+    timer.record()
+    return {"data": traces, "layout": layout}
+
+def create_bar_dict(name, year, continents, n=10):
+    return create_top_n_bar_dict(year, continents, n=n, name=name, **BAR_FIGURES[name])
+
+def create_range_dict(start, end, continents):
+    timer = PhaseTimer("range_summary")
+    series = range_series(timer, start, end, continents)
+
+    with timer.phase("traces"):
+        colors = [continent_colors[continent] for continent in continents]
+        traces = []
+        for col, (averages, changes) in enumerate(series, start=1):
+            for row, values, label in ((1, averages, "Average"), (2, changes, "Change")):
+                suffix = subplot_suffix((row - 1) * len(RANGE_METRICS) + col)
+                traces.append({
+                    "hovertemplate": RANGE_HOVERTEMPLATE,
+                    "marker": {"color": colors},
+                    "meta": label,
+                    "showlegend": False,
+                    "x": list(continents),
+                    "y": values.tolist(),
+                    "type": "bar",
+                    "xaxis": f"x{suffix}",
+                    "yaxis": f"y{suffix}",
+                })
+
+    with timer.phase("layout"):
+        layout = {
+            **range_subplot_layout(),
+            "font": {"size": 12},
+            "margin": {"b": 20, "l": 20, "r": 20, "t": 70},
+            "title": {"text": range_title(start, end)},
+            "template": default_template(),
+        }
+        change_axis = f"yaxis{len(RANGE_METRICS) + 1}"
+        layout["yaxis"] = {**layout["yaxis"], "title": {"standoff": 0, "text": "Average"}}
+        layout[change_axis] = {**layout[change_axis], "title": {"standoff": 0, "text": "Change"}}
+
+    timer.record()
+    return {"data": traces, "layout": layout}
+
+def create_country_dict(country):
+    timer = PhaseTimer("country_history")
+    index = get_dataset().countries
+    with timer.phase("filter"):
+        years, history = index.history(country)
+    color = continent_colors[index.continent[country]]
+
+    with timer.phase("traces"):
+        traces = [
+            {
+                "hovertemplate": HISTORY_HOVERTEMPLATE,
+                "line": {"color": color},
+                "mode": "lines",
+                "showlegend": False,
+                "x": years.tolist(),
+                "y": display_values(history[metric]).tolist(),
+                "type": "scatter",
+                "xaxis": f"x{subplot_suffix(i)}",
+                "yaxis": f"y{subplot_suffix(i)}",
+            }
+            for i, (metric, _) in enumerate(HISTORY_METRICS, start=1)
+        ]
+
+    with timer.phase("layout"):
+        layout = {
+            **history_subplot_layout(),
+            "font": {"size": 12},
+            "margin": {"b": 20, "l": 20, "r": 20, "t": 60},
+            "title": {"text": history_title(country, index.continent[country], index.tier[country])},
+            "template": default_template(),
+        }
+
+    timer.record()
+    return {"data": traces, "layout": layout}
+
+def figure_object(name, figure):
+    # Plotly validates every property here, which is most of what the
+    # "plotly" encoding costs over "dict". The template is left out because
+    # go.Figure attaches the same default one without validating it again.
+    layout = {key: value for key, value in figure["layout"].items() if key != "template"}
+    with timed("dashboard_figure_phase_seconds", figure=name, phase="validate"):
+        return go.Figure(data=figure["data"], layout=layout)
+
+def create_density_contour_fig(year, continents):
+    return figure_object("density_contour", create_density_contour_dict(year, continents))
+
+def create_bar_fig(name, year, continents, n=10):
+    return figure_object(name, create_bar_dict(name, year, continents, n=n))
+
+def create_mortality_bar_fig(year, continents, n=10):
+    return create_bar_fig("mortality_bar", year, continents, n=n)
+
+def create_oil_bar_fig(year, continents, n=10):
+    return create_bar_fig("oil_bar", year, continents, n=n)
+
+def create_gdp_bar_fig(year, continents, n=10):
+    return create_bar_fig("gdp_bar", year, continents, n=n)
+
+def create_range_fig(start, end, continents):
+    return figure_object("range_summary", create_range_dict(start, end, continents))
+
+def create_country_fig(country):
+    return figure_object("country_history", create_country_dict(country))
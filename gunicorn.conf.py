@@ -0,0 +1,27 @@
+# Production serving: gunicorn -c gunicorn.conf.py
+#
+# The app is built once in the master process (preload_app) and the
+# dataset is loaded there before the workers fork, so every worker reads the
+# same physical pages instead of holding its own copy. Run
+# `python dataset.py build` first so the data is memory-mapped from the
+# columnar build rather than parsed into private memory. With
+# FIGURE_CACHE_WARMUP=1 the cache is warmed in the master too, before the
+# fork, rather than in a thread the fork would cut off.
+import gc
+import multiprocessing
+import os
+
+os.environ.setdefault("PRELOAD_DATA", "1")
+os.environ.setdefault("DATA_MMAP", "1")
+
+# Importing dashboard builds nothing; gunicorn calls the factory to build
+# the one app of the process.
+wsgi_app = "dashboard:create_server()"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8050")
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count()))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") == "1"
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the collector's reach, so garbage
+    # collection in the workers doesn't write to (and un-share) those pages.
+    gc.freeze()
@@ -0,0 +1,180 @@
+import bisect
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (1e3, 2.5e3, 5e3, 1e4, 2.5e4, 5e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 1e7)
+
+METRICS = {
+    "dashboard_callback_seconds": ("Time spent in a Dash callback function.", DURATION_BUCKETS),
+    "dashboard_callback_request_seconds": (
+        "Time to serve a callback request, including Dash's encoding of the response.", DURATION_BUCKETS,
+    ),
+    "dashboard_callback_response_bytes": ("Size of a callback response body.", SIZE_BUCKETS),
+    "dashboard_figure_phase_seconds": ("Time spent in one phase of building a figure.", DURATION_BUCKETS),
+    "dashboard_figure_bytes": ("Size of a serialized figure.", SIZE_BUCKETS),
+}
+
+
+# Set by dashboard.configure() from METRICS; when off, timed() and observe() are no-ops.
+enabled = True
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense, one per label set."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+_histograms = {}
+_histograms_lock = threading.Lock()
+
+
+def histogram(name, labels):
+    key = (name, tuple(sorted(labels.items())))
+    found = _histograms.get(key)
+    if found is None:
+        with _histograms_lock:
+            found = _histograms.setdefault(key, Histogram(METRICS[name][1]))
+    return found
+
+
+def observe(name, value, **labels):
+    if enabled:
+        histogram(name, labels).observe(value)
+
+
+class timed:
+    """Context manager recording the elapsed time of its block in a histogram."""
+
+    __slots__ = ("name", "labels", "start")
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+
+
+class PhaseTimer:
+    """Adds up the time of each named phase of one figure build, so a phase
+    entered once per subplot is still recorded as one observation."""
+
+    def __init__(self, figure):
+        self.figure = figure
+        self.totals = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - start
+
+    def record(self):
+        for name, total in self.totals.items():
+            observe("dashboard_figure_phase_seconds", total, figure=self.figure, phase=name)
+
+
+def format_labels(labels, **extra):
+    pairs = [*labels, *extra.items()]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+
+def render_prometheus(extra=None):
+    """All histograms, plus optional {name: (type, help, value)} counters or
+    gauges, in the Prometheus text exposition format."""
+    with _histograms_lock:
+        items = sorted(_histograms.items())
+    lines = []
+    for name, (help_text, _) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (metric, labels), hist in items:
+            if metric != name:
+                continue
+            counts, total = hist.snapshot()
+            cumulative = 0
+            for bound, count in zip(hist.bounds, counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels, le=f'{bound:g}')} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{name}_bucket{format_labels(labels, le='+Inf')} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {cumulative}")
+    for name, (kind, help_text, value) in (extra or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+class RequestProfiler:
+    """Profiles single requests that ask for it with an X-Profile header.
+
+    "cprofile" dumps pstats of the handling thread, "tracemalloc" the top
+    allocation sites, into `directory`. The file name is returned in the
+    X-Profile response header. Only one request is profiled at a time, since
+    tracemalloc traces the whole process; others are served unprofiled.
+    """
+
+    def __init__(self, directory, top=50):
+        self.directory = directory
+        self.top = top
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def start(self, kind):
+        if kind not in ("cprofile", "tracemalloc") or not self._lock.acquire(blocking=False):
+            return None
+        if kind == "cprofile":
+            profile = cProfile.Profile()
+            profile.enable()
+            return kind, profile
+        tracemalloc.start(25)
+        return kind, None
+
+    def stop(self, session, name):
+        kind, profile = session
+        path = os.path.join(self.directory, f"{time.time_ns()}-{os.getpid()}-{name}")
+        try:
+            if kind == "cprofile":
+                profile.disable()
+                path += ".prof"
+                profile.dump_stats(path)
+            else:
+                snapshot = tracemalloc.take_snapshot()
+                peak = tracemalloc.get_traced_memory()[1]
+                path += ".txt"
+                with open(path, "w") as f:
+                    f.write(f"peak traced memory: {peak} bytes\n")
+                    for stat in snapshot.statistics("lineno")[:self.top]:
+                        f.write(f"{stat}\n")
+        finally:
+            if kind == "tracemalloc":
+                tracemalloc.stop()
+            self._lock.release()
+        return os.path.basename(path)
@@ -0,0 +1,368 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Output column -> (World Bank wide CSV, name of its country column).
+INDICATORS = {
+    'Mortality Rate': ('mortality_rate.csv', 'Country Name'),
+    'Oil Consumption per capita (tonnes per year)': (
+        'oil_consumption_per_capita.csv', 'Oil Consumption per capita (tonnes per year)'
+    ),
+    'Population': ('population.csv', 'Country Name'),
+    'GDP per capita (US$)': ('gdp_per_capita_usdollars.csv', 'Country Name'),
+}
+
+country_to_continent = {
+    'United States': 'North America',
+    'Canada': 'North America',
+    'Mexico': 'North America',
+    'Argentina': 'South America',
+    'Ecuador': 'South America',
+    'Brazil': 'South America',
+    'Chile': 'South America',
+    'Colombia': 'South America',
+    'Peru': 'South America',
+    'Azerbaijan': 'Asia',
+    'Bangladesh': 'Asia',
+    'China': 'Asia',
+    'United Arab Emirates': 'Asia',
+    'Saudi Arabia': 'Asia',
+    'India': 'Asia',
+    'Indonesia': 'Asia',
+    'Russia': 'Asia',
+    'Japan': 'Asia',
+    'Kazakhstan': 'Asia',
+    'Korea, Rep.': 'Asia',
+    'Kuwait': 'Asia',
+    'Malaysia': 'Asia',
+    'Pakistan': 'Asia',
+    'Philippines': 'Asia',
+    'Qatar': 'Asia',
+    'Singapore': 'Asia',
+    'Thailand': 'Asia',
+    'Turkmenistan': 'Asia',
+    'Uzbekistan': 'Asia',
+    'Austria': 'Europe',
+    'Bulgaria': 'Europe',
+    'Belarus': 'Europe',
+    'Switzerland': 'Europe',
+    'United Kingdom': 'Europe',
+    'France': 'Europe',
+    'Germany': 'Europe',
+    'Spain': 'Europe',
+    'Denmark': 'Europe',
+    'Finland': 'Europe',
+    'Greece': 'Europe',
+    'Hungary': 'Europe',
+    'Ireland': 'Europe',
+    'Iceland': 'Europe',
+    'Italy': 'Europe',
+    'Lithuania': 'Europe',
+    'Netherlands': 'Europe',
+    'Norway': 'Europe',
+    'Poland': 'Europe',
+    'Portugal': 'Europe',
+    'Romania': 'Europe',
+    'Slovak Republic': 'Europe',
+    'Ukraine': 'Europe',
+    'Sweden': 'Europe',
+    'Australia': 'Oceania',
+    'New Zealand': 'Oceania',
+    'South Africa': 'Africa',
+    'Algeria': 'Africa',
+}
+
+def content_hash(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(part, index=False).to_numpy().tobytes())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+class StageStore:
+    """Stage outputs on disk, addressed by the hash of the stage's inputs."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.ran = []
+        self.reused = []
+
+    def path(self, stage, key):
+        return os.path.join(self.cache_dir, stage, f"{key}.pkl")
+
+    def get_or_run(self, stage, key, run, label=None):
+        path = self.path(stage, key)
+        label = label or stage
+        if os.path.exists(path):
+            self.reused.append(label)
+            return pd.read_pickle(path)
+        result = run()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so an interrupted run never leaves a partial entry.
+        result.to_pickle(path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.ran.append(label)
+        return result
+
+def read_indicator(path, country_column):
+    wide = pd.read_csv(path)
+    wide = wide.rename(columns={country_column: 'Country'})
+    # Keep only the country and the year columns (drops e.g. 'Indicator Name').
+    year_columns = [c for c in wide.columns if str(c).strip().isdigit()]
+    return wide[['Country', *year_columns]]
+
+# Part of each merge key; bumped when melt_merge_year's output changes, so
+# older cached frames are not reused.
+MERGE_FORMAT_VERSION = 2
+
+def melt_merge_year(wide_tables, year):
+    """Long rows for one year, inner-joined across every indicator."""
+    merged = None
+    for name, wide in wide_tables.items():
+        # Same dtypes as stream_indicators: int years, float64 values.
+        long = wide[['Country', year]].rename(columns={year: name}).astype({name: np.float64})
+        long.insert(1, 'Year', int(year))
+        merged = long if merged is None else pd.merge(merged, long, on=['Country', 'Year'], how='inner')
+    return merged
+
+def stream_indicators(input_dir, chunksize=1000):
+    """Inner-join every indicator on (Country, Year), reading each file in row chunks.
+
+    Each indicator is kept as one float array of countries x years instead of
+    a melted frame, and the join maps both key parts to array positions. Also
+    returns a content key per year, hashed chunk by chunk as the files stream.
+    """
+    country_ids = {}
+    indicators = {}
+    year_digests = {}
+
+    for name, (file_name, country_column) in INDICATORS.items():
+        path = os.path.join(input_dir, file_name)
+        header = pd.read_csv(path, nrows=0).columns
+        year_columns = [c for c in header if str(c).strip().isdigit()]
+        country_digest = hashlib.sha256()
+        value_digests = {int(year): hashlib.sha256() for year in year_columns}
+        codes, blocks = [], []
+        for chunk in pd.read_csv(path, usecols=[country_column, *year_columns], chunksize=chunksize):
+            countries = chunk[country_column].astype(str).tolist()
+            values = chunk[year_columns].to_numpy(dtype=np.float64)
+            codes.append(np.array([country_ids.setdefault(c, len(country_ids)) for c in countries]))
+            blocks.append(values)
+            # Countries and each year's values are hashed as separate streams,
+            # so the keys don't depend on the chunk size.
+            country_digest.update("".join(c + "\0" for c in countries).encode())
+            for j, year in enumerate(year_columns):
+                value_digests[int(year)].update(np.ascontiguousarray(values[:, j]).tobytes())
+        for year, value_digest in value_digests.items():
+            year_digests.setdefault(year, hashlib.sha256()).update(
+                name.encode() + country_digest.digest() + value_digest.digest()
+            )
+        indicators[name] = (
+            np.concatenate(codes),
+            np.concatenate(blocks),
+            [int(year) for year in year_columns],
+        )
+
+    years = sorted(set.intersection(*[set(years) for _, _, years in indicators.values()]))
+    # Countries in every file, in the order of the first one, as the
+    # notebook's chain of inner merges keeps them.
+    first_codes = next(iter(indicators.values()))[0]
+    shared = set(first_codes.tolist())
+    for codes, _, _ in indicators.values():
+        shared &= set(codes.tolist())
+    country_order = np.array([code for code in dict.fromkeys(first_codes.tolist()) if code in shared], dtype=int)
+    names = np.array(list(country_ids), dtype=object)
+
+    joined = {
+        'Country': np.tile(names[country_order], len(years)),
+        'Year': np.repeat(years, len(country_order)),
+    }
+    for name, (codes, values, indicator_years) in indicators.items():
+        row_of = np.full(len(country_ids), -1)
+        row_of[codes] = np.arange(len(codes))
+        year_position = {year: i for i, year in enumerate(indicator_years)}
+        columns = [year_position[year] for year in years]
+        # countries x years, laid out year-major like a melt.
+        joined[name] = values[np.ix_(row_of[country_order], columns)].T.ravel()
+
+    year_keys = {year: year_digests[year].hexdigest() for year in years}
+    return pd.DataFrame(joined), year_keys
+
+def impute_knn(merged_df):
+    knn_df = merged_df.drop(columns=['Country'])
+    if not knn_df.isna().to_numpy().any():
+        return merged_df
+
+    from sklearn.impute import KNNImputer
+
+    imputer = KNNImputer(n_neighbors=5)
+    imputed_df = pd.DataFrame(imputer.fit_transform(knn_df), columns=knn_df.columns, index=knn_df.index)
+    merged_df = merged_df.copy()
+    merged_df.update(imputed_df)
+    return merged_df
+
+# Below this many countries per process, pool startup costs more than it saves.
+MIN_COUNTRIES_PER_WORKER = 50
+
+def interpolate_countries(years, values, starts):
+    """Fill gaps along time within each country's block of year-sorted rows.
+
+    Gaps between observations are interpolated linearly; leading and trailing
+    gaps take the nearest observed value.
+    """
+    values = values.copy()
+    bounds = [*starts, len(years)]
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        x = years[start:stop]
+        for j in range(values.shape[1]):
+            column = values[start:stop, j]
+            missing = np.isnan(column)
+            if missing.any() and not missing.all():
+                column[missing] = np.interp(x[missing], x[~missing], column[~missing])
+    return values
+
+def impute_timeseries(merged_df, workers=1, cross_country_fallback=True):
+    """Impute each country along its own time axis instead of across the table."""
+    metrics = list(INDICATORS)
+    codes, _ = pd.factorize(merged_df['Country'])
+    years = merged_df['Year'].astype(int).to_numpy()
+    order = np.lexsort((years, codes))
+    sorted_years = years[order]
+    sorted_values = merged_df[metrics].to_numpy(dtype=np.float64)[order]
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+
+    if workers > 1 and len(starts) >= workers * MIN_COUNTRIES_PER_WORKER:
+        # Whole countries per batch, so each worker interpolates independently.
+        batches = np.array_split(starts, workers)
+        bounds = [batch[0] for batch in batches] + [len(sorted_years)]
+        with ProcessPoolExecutor(workers) as pool:
+            filled = np.concatenate(list(pool.map(
+                interpolate_countries,
+                [sorted_years[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])],
+                [sorted_values[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:])],
+                [batch - batch[0] for batch in batches],
+            )))
+    else:
+        filled = interpolate_countries(sorted_years, sorted_values, starts)
+
+    if cross_country_fallback and np.isnan(filled).any():
+        # Countries with no observation at all for a metric take that
+        # year's median across the other countries.
+        filled_df = pd.DataFrame(filled)
+        filled = filled_df.fillna(filled_df.groupby(sorted_years).transform('median')).to_numpy()
+
+    values = np.empty_like(filled)
+    values[order] = filled
+    merged_df = merged_df.copy()
+    merged_df[metrics] = values
+    return merged_df
+
+IMPUTERS = {
+    'timeseries': impute_timeseries,
+    'knn': lambda merged_df, workers=1: impute_knn(merged_df),
+}
+
+def finalize(merged_df):
+    merged_df = merged_df.copy()
+    merged_df['Year'] = merged_df['Year'].astype(int)
+    merged_df['Mortality Rate'] = round(merged_df['Mortality Rate'], 1)
+    merged_df['Oil Consumption per capita (tonnes per year)'] = round(merged_df['Oil Consumption per capita (tonnes per year)'], 2)
+    merged_df['Population'] = merged_df['Population'].astype(int)
+    merged_df['GDP per capita (US$)'] = merged_df['GDP per capita (US$)'].astype(int)
+    merged_df['Continent'] = merged_df['Country'].map(country_to_continent).fillna('Other')
+    merged_df['GDP per capita (log US$)'] = np.log(merged_df['GDP per capita (US$)'])
+    return merged_df.reset_index(drop=True)
+
+def melt_merge(input_dir, store):
+    wide_tables = {}
+    for name, (file_name, country_column) in INDICATORS.items():
+        wide_tables[name] = read_indicator(os.path.join(input_dir, file_name), country_column)
+
+    common_years = set.intersection(*[set(wide.columns[1:]) for wide in wide_tables.values()])
+    years = sorted(common_years, key=int)
+
+    # Melt + merge runs per year, keyed by that year's column in every
+    # indicator, so a new or revised year only recomputes itself.
+    year_frames = []
+    year_keys = []
+    for year in years:
+        key = content_hash(MERGE_FORMAT_VERSION, year, *[
+            part for name, wide in wide_tables.items() for part in (name, wide[['Country', year]])
+        ])
+        frame = store.get_or_run(
+            "merge", key, lambda: melt_merge_year(wide_tables, year), label=f"merge {year}"
+        )
+        year_frames.append(frame)
+        year_keys.append(key)
+    return pd.concat(year_frames, ignore_index=True), year_keys
+
+def run_pipeline(input_dir, output_path, cache_dir, streaming=False, chunksize=1000,
+                 imputer='timeseries', workers=1):
+    store = StageStore(cache_dir)
+
+    if streaming:
+        merged_df, keys_by_year = stream_indicators(input_dir, chunksize)
+        year_keys = ["stream", *keys_by_year.values()]
+    else:
+        merged_df, year_keys = melt_merge(input_dir, store)
+
+    # Imputation sees the whole panel, so it depends on every year's key.
+    imputed_df = store.get_or_run(
+        "impute", content_hash(imputer, year_keys),
+        lambda: IMPUTERS[imputer](merged_df, workers=workers),
+    )
+    final_df = finalize(imputed_df)
+
+    output_hash = content_hash(final_df)
+    hash_path = output_path + ".sha256"
+    if os.path.exists(output_path) and os.path.exists(hash_path):
+        with open(hash_path) as f:
+            if f.read().strip() == output_hash:
+                return store, False
+    final_df.to_csv(output_path, index=False)
+    with open(hash_path, "w") as f:
+        f.write(output_hash)
+    return store, True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Build oil_consumption_mortality.csv from the World Bank indicator CSVs."
+    )
+    parser.add_argument("--input-dir", default=".")
+    parser.add_argument("--output", default="oil_consumption_mortality.csv")
+    parser.add_argument("--cache-dir", default=".pipeline_cache")
+    parser.add_argument("--streaming", action="store_true",
+                        help="read the indicator files in row chunks and join them without melting")
+    parser.add_argument("--chunksize", type=int, default=1000)
+    parser.add_argument("--imputer", choices=sorted(IMPUTERS), default="timeseries",
+                        help="per-country time interpolation, or the notebook's whole-table KNN")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="processes used by the timeseries imputer")
+    parser.add_argument("--build-columnar", action="store_true",
+                        help="also rebuild the columnar dataset used by the app")
+    args = parser.parse_args(argv)
+
+    store, written = run_pipeline(
+        args.input_dir, args.output, args.cache_dir,
+        streaming=args.streaming, chunksize=args.chunksize,
+        imputer=args.imputer, workers=args.workers,
+    )
+    print(f"ran: {', '.join(store.ran) or 'nothing'}")
+    print(f"reused: {len(store.reused)} cached stage outputs")
+    print(f"{'wrote' if written else 'unchanged'}: {args.output}")
+
+    if args.build_columnar:
+        from dataset import build_columnar
+
+        print(f"Wrote {build_columnar(args.output)}")
+
+if __name__ == "__main__":
+    main()
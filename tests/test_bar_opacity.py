@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from figures import BAR_FIGURES, top_n_bar_series
+
+# The per-row get_alpha of each bar chart that the binning replaced.
+def old_mortality_alpha(rate):
+    if rate <= 50:
+        return 0.15
+    elif rate <= 100:
+        return 0.3
+    elif rate <= 200:
+        return 0.55
+    elif rate <= 400:
+        return 0.8
+    else:
+        return 1
+
+def old_oil_alpha(rate):
+    if rate <= 2:
+        return 0.15
+    elif rate <= 4:
+        return 0.3
+    elif rate <= 7.5:
+        return 0.55
+    elif rate <= 10:
+        return 0.8
+    else:
+        return 1
+
+def old_gdp_alpha(rate):
+    if rate <= 5000:
+        return 0.15
+    elif rate <= 20000:
+        return 0.3
+    elif rate <= 40000:
+        return 0.55
+    elif rate <= 70000:
+        return 0.8
+    else:
+        return 1
+
+@pytest.mark.parametrize("name, old_alpha", [
+    ("mortality_bar", old_mortality_alpha),
+    ("oil_bar", old_oil_alpha),
+    ("gdp_bar", old_gdp_alpha),
+])
+def test_opacity_matches_the_old_get_alpha(data, name, old_alpha):
+    spec = BAR_FIGURES[name]
+    metric = spec["metric"]
+    # Every row of the dataset, plus rows exactly on each level and one above
+    # the last.
+    edges = [*spec["levels"], 2 * spec["levels"][-1]]
+    on_levels = data.df.iloc[:len(edges)].copy()
+    on_levels[metric] = pd.Series(edges, index=on_levels.index).astype(data.df[metric].dtype)
+    rows = pd.concat([data.df, on_levels], ignore_index=True)
+
+    _, values, _, opacity, _, _ = top_n_bar_series(
+        rows, data.continents, metric, spec["levels"], spec["alphas"],
+        spec["hover_label"], spec.get("hover_columns", ()),
+    )
+    # values are the shown ones, i.e. what get_alpha saw in the CSV.
+    assert opacity.tolist() == [old_alpha(value) for value in values]
+    assert opacity[-len(edges):].tolist() == [*spec["alphas"], 1]
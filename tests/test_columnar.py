@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+import pytest
+
+from dataset import build_columnar, columnar_is_fresh, columnar_path, load_columnar, load_csv
+
+@pytest.fixture
+def path(csv_path, tmp_path):
+    path = tmp_path / "data.csv"
+    path.write_bytes(open(csv_path, "rb").read())
+    return path
+
+@pytest.mark.parametrize("mmap", [False, True])
+def test_columnar_load_matches_the_csv(path, mmap):
+    loaded = load_columnar(build_columnar(str(path)), mmap=mmap)
+    # Builds are stored in (year, continent) order.
+    expected = load_csv(str(path)).sort_values(["Year", "Continent"], kind="stable").reset_index(drop=True)
+    pd.testing.assert_frame_equal(loaded, expected)
+    assert isinstance(loaded["Oil Producing Countries"].dtype, pd.CategoricalDtype)
+
+def test_touching_the_csv_makes_the_build_stale(path):
+    columns_dir = build_columnar(str(path))
+    assert columnar_is_fresh(str(path), columns_dir)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert not columnar_is_fresh(str(path), columns_dir)
+
+def test_rebuild_leaves_mapped_builds_intact(path):
+    columns_dir = build_columnar(str(path))
+    mapped = load_columnar(columns_dir, mmap=True)
+    before = mapped["Mortality Rate"].to_numpy().copy()
+
+    df = pd.read_csv(path)
+    df["Mortality Rate"] = 1.0
+    df.to_csv(path, index=False)
+    build_columnar(str(path))
+
+    # A worker serving the old build still sees the old data.
+    assert (mapped["Mortality Rate"].to_numpy() == before).all()
+    assert (load_columnar(columns_dir)["Mortality Rate"] == 1.0).all()
+
+    # Only the current and the previous build are kept.
+    build_columnar(str(path))
+    files = [name for name in os.listdir(columnar_path(str(path))) if name.endswith(".npy")]
+    assert len(files) == 2 * len(mapped.columns)
@@ -0,0 +1,34 @@
+import itertools
+
+import pytest
+
+from dataset import RANKED_METRICS, TOP_K
+
+def continent_subsets(continents):
+    # Every continent alone, every pair and all of them.
+    return [list(subset) for size in (1, 2, len(continents)) for subset in itertools.combinations(continents, size)]
+
+@pytest.mark.parametrize("metric", RANKED_METRICS)
+def test_top_n_matches_nlargest(data, metric):
+    for year in data.years[::7]:
+        for continents in continent_subsets(data.continents):
+            for n in (1, 10, TOP_K):
+                expected = data.select_rows(year, continents).nlargest(n, metric)
+                merged = data.top_n(year, continents, metric, n)
+                assert merged[metric].tolist() == expected[metric].tolist()
+                # nlargest does not always keep equal values in row order; the
+                # merge does, so only the rows per value have to agree.
+                assert sorted(zip(merged[metric], merged.index)) == sorted(zip(expected[metric], expected.index))
+
+@pytest.mark.parametrize("country", ["China", "Norway", "Algeria", "Ecuador"])
+def test_country_history_matches_a_mask(data, country):
+    expected = data.df[data.df["Country"] == country].sort_values("Year")
+    years, history = data.countries.history(country)
+    assert years.tolist() == expected["Year"].tolist()
+    for metric in RANKED_METRICS:
+        assert history[metric].tolist() == expected[metric].tolist()
+
+def test_unknown_country_has_no_history(data):
+    assert "Atlantis" not in data.countries.slices
+    with pytest.raises(KeyError):
+        data.countries.history("Atlantis")
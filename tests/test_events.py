@@ -0,0 +1,31 @@
+from dataset import load_event_table
+
+def test_events_expand_to_text_per_year(tmp_path):
+    path = tmp_path / "events.csv"
+    path.write_text(
+        "Continent,Category,Event,Start Year,End Year\n"
+        "Asia,Wars,Gulf,1990,1991\n"
+        "Asia,Wars,Iraq,1991,\n"
+        "Asia,Crises,Oil,1991,1991\n"
+        "Asia,Wars,Gulf,1993,1993\n"
+        "Europe,Wars,Kosovo,1998,1999\n"
+    )
+    table = load_event_table(str(path))
+    assert table == {
+        ("Asia", 1990): "<b>Wars (1990):</b><br>Gulf<br>",
+        # An empty End Year is the Start Year alone; categories keep file order.
+        ("Asia", 1991): "<b>Wars (1991):</b><br>Gulf<br>Iraq<br><b>Crises (1991):</b><br>Oil<br>",
+        # A repeated name is a second interval, not a replacement of the first.
+        ("Asia", 1993): "<b>Wars (1993):</b><br>Gulf<br>",
+        ("Europe", 1998): "<b>Wars (1998):</b><br>Kosovo<br>",
+        ("Europe", 1999): "<b>Wars (1999):</b><br>Kosovo<br>",
+    }
+
+def test_bundled_events(events_path):
+    table = load_event_table(events_path)
+    assert "Gulf<br>" in table[("Asia", 1990)]
+    # Single-year events show in their year only.
+    assert "Egypt-Libya<br>" in table[("Africa", 1977)]
+    assert "Egypt-Libya<br>" not in table.get(("Africa", 1978), "")
+    # Both intervals of a repeated name are kept.
+    assert "Iraq<br>" in table[("Asia", 1995)] and "Iraq<br>" in table[("Asia", 2003)]
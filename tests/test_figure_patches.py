@@ -0,0 +1,55 @@
+import copy
+import json
+import pytest
+
+import dashboard
+
+@pytest.fixture(scope="module", params=["plotly", "dict"])
+def encoding(request, config):
+    dashboard.configure({**config, "FIGURE_ENCODING": request.param})
+    dashboard.figure_cache.clear()
+    dashboard.diff_cache.clear()
+    return request.param
+
+def apply_ops(figure, ops):
+    # What APPLY_FIGURE_DELTA_JS does in the browser.
+    figure = copy.deepcopy(figure)
+    for paths, *value in ops:
+        for path in paths if isinstance(paths, list) else [paths]:
+            *keys, last = path.split(".")
+            target = figure
+            for key in keys:
+                target = target[int(key)] if isinstance(target, list) else target[key]
+            if isinstance(target, list):
+                last = int(last)
+            if not value:
+                del target[last]
+            elif len(value) == 2:
+                target[last] = target[last][:value[1]] + value[0]
+            elif isinstance(target, list) and last == len(target):
+                target.append(copy.deepcopy(value[0]))
+            else:
+                target[last] = copy.deepcopy(value[0])
+    return figure
+
+def as_sent(value):
+    return json.loads(dashboard.dumps(value))
+
+STATES = [
+    ((1990, ["Asia", "Europe"]), (1991, ["Asia", "Europe"])),
+    ((1965, ["Africa"]), (2016, ["Africa"])),
+    ((2000, ["Asia"]), (2000, ["Asia", "Europe", "Africa"])),
+    ((2000, ["Asia", "Europe", "Africa"]), (2001, ["Europe"])),
+    ((1975, ["Oceania"]), (1976, ["North America", "South America"])),
+]
+
+@pytest.mark.parametrize("old_state, new_state", STATES + [(new, old) for old, new in STATES])
+def test_ops_reproduce_the_new_figures(encoding, old_state, new_state):
+    old_figures = dashboard.get_figures(*old_state)
+    new_figures = dashboard.get_figures(*new_state)
+    ops = dashboard.get_figure_diffs(*old_state, *new_state)
+    for old, new, figure_ops in zip(old_figures, new_figures, ops):
+        assert apply_ops(as_sent(old), as_sent(figure_ops)) == as_sent(new)
+
+def test_unchanged_state_sends_no_ops(encoding):
+    assert dashboard.get_figure_diffs(1990, ["Asia"], 1990, ["Asia"]) == [[], [], []]
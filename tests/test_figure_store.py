@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+import dashboard
+from figure_cache import FileSystemStore, LocalStore
+
+class CountingStore(LocalStore):
+    def __init__(self):
+        super().__init__()
+        self.gets = 0
+        self.sets = 0
+
+    def get(self, key):
+        self.gets += 1
+        return super().get(key)
+
+    def set(self, key, value):
+        self.sets += 1
+        super().set(key, value)
+
+@pytest.fixture
+def store(config):
+    store = CountingStore()
+    dashboard.configure({**config, "FIGURE_ENCODING": "dict", "FIGURE_STORE": store})
+    dashboard.figure_cache.clear()
+    yield store
+    dashboard.configure(config)
+    dashboard.figure_cache.clear()
+
+def test_cold_state_is_encoded_and_stored_once(store, monkeypatch):
+    encoded = []
+    dumps = dashboard.dumps
+    monkeypatch.setattr(dashboard, "dumps", lambda value: encoded.append(value) or dumps(value))
+
+    payload = dashboard.get_figures_json(1990, ["Europe", "Asia"])
+    assert (store.gets, store.sets, len(encoded)) == (1, 1, 1)
+    assert dashboard.loads(payload) == dashboard.loads(dumps(dashboard.get_figures(1990, ["Asia", "Europe"])))
+
+    assert dashboard.get_figures_json(1990, ["Asia", "Europe"]) == payload
+    assert (store.gets, store.sets, len(encoded)) == (2, 1, 1)
+
+def test_filesystem_store_keeps_the_newest_entries(tmp_path):
+    store = FileSystemStore(str(tmp_path), max_entries=20)
+    for i in range(30):
+        store.set(f"key{i}", b"x")
+        os.utime(store._path(f"key{i}"), (i, i))
+    # Pruned on the 2nd, 4th, ... write, never left over the bound by more than 2.
+    assert len(os.listdir(tmp_path)) <= 22
+    store.prune()
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(store._path(f"key{i}")) for i in range(10, 30))
+    assert store.get("key29") == b"x" and store.get("key0") is None
+
+@pytest.fixture(scope="module")
+def client(config):
+    # The process's one app; its settings are the module globals, set again here.
+    server = dashboard.server
+    dashboard.configure({**config, "FIGURE_ENCODING": "dict"})
+    return server.test_client()
+
+def test_figures_route_revalidates_by_etag(client, monkeypatch):
+    response = client.get("/figures/1990?continents=Europe,Asia")
+    assert response.status_code == 200
+    assert len(response.get_json()) == 3
+    etag = response.headers["ETag"]
+    # The same state in another order has the same ETag.
+    assert client.get("/figures/1990?continents=Asia,Europe").headers["ETag"] == etag
+
+    with monkeypatch.context() as patch:
+        patch.setattr(dashboard, "get_figures_json", lambda *args: pytest.fail("a 304 built the figures"))
+        response = client.get("/figures/1990?continents=Asia,Europe", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get("/figures/1991?continents=Asia,Europe", headers={"If-None-Match": etag}).status_code == 200
+
+def test_figures_route_rejects_unknown_states(client):
+    assert client.get("/figures/1990?continents=Atlantis").status_code == 400
+    assert client.get("/figures/1800").status_code == 404
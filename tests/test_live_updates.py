@@ -0,0 +1,42 @@
+import pytest
+from dash.exceptions import PreventUpdate
+
+import dashboard
+
+@pytest.fixture(scope="module", autouse=True)
+def configured(config):
+    dashboard.configure({**config, "FIGURE_ENCODING": "dict"})
+
+def request(year, client, seq, continents=("Asia",)):
+    return {"year": year, "continents": list(continents), "client": client, "seq": seq}
+
+def test_is_superseded_by_a_newer_request_of_the_same_tab():
+    assert not dashboard.is_superseded("tab-a", 3, record=True)
+    assert dashboard.is_superseded("tab-a", 2, record=True)
+    assert not dashboard.is_superseded("tab-a", 3)
+    # An older request does not lower the newest seq seen.
+    assert dashboard.is_superseded("tab-a", 2)
+    assert not dashboard.is_superseded("tab-b", 1)
+
+def test_superseded_request_is_dropped():
+    dashboard.update_figures(request(1990, "tab-c", 5))
+    with pytest.raises(PreventUpdate):
+        dashboard.update_figures(request(1991, "tab-c", 4))
+
+def test_request_overtaken_while_building_is_dropped(monkeypatch):
+    get_figures = dashboard.get_figures
+
+    def overtaken(year, continents):
+        # A newer request from the same tab arrives during the build.
+        dashboard.is_superseded("tab-d", 2, record=True)
+        return get_figures(year, continents)
+
+    monkeypatch.setattr(dashboard, "get_figures", overtaken)
+    with pytest.raises(PreventUpdate):
+        dashboard.update_figures(request(1990, "tab-d", 1))
+
+def test_empty_selection_keeps_the_rendered_state():
+    rendered = dashboard.rendered_state(1990, ["Asia"])
+    delta = dashboard.update_figures(request(1991, "tab-e", 1, continents=()), rendered)
+    assert delta["ops"] == [[], [], []]
+    assert {key: delta["state"][key] for key in rendered} == rendered
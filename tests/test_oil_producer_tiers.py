@@ -0,0 +1,31 @@
+import pandas as pd
+
+from dataset import (
+    DTYPES, OIL_PRODUCER_TIERS, add_oil_producer_tiers, oil_prod_1M_5M_barrels_day, oil_prod_10M_12M_barrels_day,
+    oil_prod_10k_100k_barrels_day, oil_prod_100k_500k_barrels_day, oil_prod_500k_1M_barrels_day,
+)
+
+def old_tier(x):
+    # The per-row lambda the mapping replaced.
+    return '10M-12M barrels/day' \
+        if x in oil_prod_10M_12M_barrels_day else (
+        '1M-5M barrels/day'
+        if x in oil_prod_1M_5M_barrels_day else (
+        '500k-1M barrels/day'
+        if x in oil_prod_500k_1M_barrels_day else (
+        '100k-500k barrels/day'
+        if x in oil_prod_100k_500k_barrels_day else (
+        '10k-100k barrels/day'
+        if x in oil_prod_10k_100k_barrels_day else (
+        '<10k barrels/day'
+        )))))
+
+def test_tiers_match_the_old_lambda(csv_path):
+    df = pd.read_csv(csv_path, dtype=DTYPES)
+    # Every listed country too, including those missing from the data.
+    listed = [country for _, countries in OIL_PRODUCER_TIERS for country in countries]
+    countries = pd.concat([df["Country"].astype(str), pd.Series(listed)], ignore_index=True)
+    for frame in (pd.DataFrame({"Country": countries}), pd.DataFrame({"Country": countries.astype("category")})):
+        tiers = add_oil_producer_tiers(frame)["Oil Producing Countries"]
+        assert tiers.dtype == "category"
+        assert tiers.astype(str).tolist() == [old_tier(country) for country in countries]
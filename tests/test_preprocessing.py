@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from preprocessing import INDICATORS, StageStore, impute_timeseries, melt_merge, stream_indicators
+
+@pytest.fixture(scope="module")
+def indicator_dir(csv_path, tmp_path_factory):
+    """The four wide World Bank CSVs, rebuilt from the bundled data.
+
+    The files disagree the way the real ones do: countries in a different
+    order, countries and years missing from some files, blank cells and an
+    extra text column.
+    """
+    directory = tmp_path_factory.mktemp("indicators")
+    df = pd.read_csv(csv_path)
+    rng = np.random.default_rng(0)
+    for i, (name, (file_name, country_column)) in enumerate(INDICATORS.items()):
+        wide = df.pivot(index='Country', columns='Year', values=name)
+        wide.columns = wide.columns.astype(str)
+        wide = wide.iloc[rng.permutation(len(wide))].iloc[i:]
+        if i == 1:
+            wide.loc['Atlantis'] = 1.0
+            wide = wide.drop(columns=wide.columns[-1])
+        if i == 2:
+            wide.iloc[::7, ::5] = np.nan
+        wide = wide.rename_axis(country_column).reset_index()
+        wide.insert(1, 'Indicator Name', name)
+        wide.to_csv(directory / file_name, index=False)
+    return directory
+
+def test_streaming_join_matches_melt_merge(indicator_dir, tmp_path):
+    melted, _ = melt_merge(indicator_dir, StageStore(tmp_path))
+    streamed, _ = stream_indicators(indicator_dir, chunksize=7)
+    assert len(melted) > 0
+    pd.testing.assert_frame_equal(streamed, melted)
+
+MORTALITY, OIL, POPULATION, GDP = INDICATORS
+
+@pytest.fixture
+def gappy():
+    # Rows out of (country, year) order; 2005 follows 2002, so interpolation
+    # has to go by year, not by row position.
+    nan = np.nan
+    return pd.DataFrame({
+        'Country': ['B', 'A', 'C', 'A', 'B', 'C', 'A', 'C', 'B', 'A', 'B', 'C'],
+        'Year': [2000, 2005, 2000, 2001, 2001, 2001, 2000, 2002, 2002, 2002, 2005, 2005],
+        MORTALITY: [10, 6, 1, nan, 20, 1, 1, 1, nan, nan, 50, 1],
+        OIL: [1, nan, 1, 2, 1, 1, nan, 1, 1, 3, 1, 1],
+        POPULATION: [100, 5, nan, 2, 200, nan, 1, nan, 300, 3, 600, nan],
+        GDP: [1.0] * 12,
+    })
+
+def imputed(df, **kwargs):
+    return impute_timeseries(df, **kwargs).set_index(['Country', 'Year']).sort_index()
+
+def test_interior_gaps_are_interpolated_by_year(gappy):
+    result = imputed(gappy)
+    assert result.loc['A', MORTALITY].tolist() == [1, 2, 3, 6]
+    assert result.loc['B', MORTALITY].tolist() == [10, 20, 27.5, 50]
+
+def test_leading_and_trailing_gaps_take_the_nearest_value(gappy):
+    assert imputed(gappy).loc['A', OIL].tolist() == [2, 2, 3, 3]
+
+def test_country_without_observations_takes_the_year_median(gappy):
+    result = imputed(gappy)
+    # Medians of A and B per year.
+    assert result.loc['C', POPULATION].tolist() == [50.5, 101, 151.5, 302.5]
+    assert imputed(gappy, cross_country_fallback=False).loc['C', POPULATION].isna().all()
+
+def test_imputation_keeps_the_rows_in_place(gappy):
+    result = impute_timeseries(gappy)
+    pd.testing.assert_frame_equal(result[['Country', 'Year']], gappy[['Country', 'Year']])
+    observed = gappy[list(INDICATORS)].notna()
+    pd.testing.assert_frame_equal(result[list(INDICATORS)][observed], gappy[list(INDICATORS)][observed], check_dtype=False)
+    assert not result[list(INDICATORS)].isna().any().any()
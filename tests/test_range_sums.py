@@ -0,0 +1,15 @@
+import numpy as np
+import pytest
+
+from dataset import METRIC_COLUMNS
+
+@pytest.mark.parametrize("start, end", [(1990, 1990), (1990, 2000), (2005, 2016), (1900, 2100)])
+def test_range_averages_match_groupby(data, start, end):
+    df = data.df[(data.df["Year"] >= start) & (data.df["Year"] <= end)]
+    for metric in METRIC_COLUMNS:
+        rows = df[df[metric].notna()]
+        values = rows[metric].astype(np.float64) * rows["Population"].astype(np.float64)
+        grouped = values.groupby(rows["Continent"], observed=True).sum() / \
+            rows["Population"].astype(np.float64).groupby(rows["Continent"], observed=True).sum()
+        expected = [grouped.get(continent, np.nan) for continent in data.continents]
+        np.testing.assert_allclose(data.range_sums.continent_averages(metric, start, end), expected, rtol=1e-9)
@@ -0,0 +1,58 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import dashboard
+from dataset import IndexedDataset
+
+def test_changed_groups_after_one_cell_edit(data):
+    metric = "Mortality Rate"
+    row = int(np.flatnonzero(data.df[metric].to_numpy() < data.metric_max[metric] / 2)[0])
+    edited = data.df.copy()
+    edited.loc[row, metric] = edited.loc[row, metric] * 1.5
+    key = (int(edited.loc[row, "Year"]), edited.loc[row, "Continent"])
+    assert data.changed_groups(IndexedDataset(edited)) == {key}
+
+def test_changed_groups_when_a_maximum_changes(data):
+    metric = "Mortality Rate"
+    edited = data.df.copy()
+    edited.loc[int(data.df[metric].idxmax()), metric] = data.metric_max[metric] * 2
+    # Every bar chart's axis range depends on the maximum.
+    assert data.changed_groups(IndexedDataset(edited)) is None
+
+def sent(value):
+    return json.loads(dashboard.dumps(value))
+
+@pytest.fixture(params=["plotly", "dict"])
+def reloadable_csv(request, config, csv_path, tmp_path):
+    encoding = request.param
+    path = tmp_path / "data.csv"
+    path.write_bytes(open(csv_path, "rb").read())
+    dashboard.configure({**config, "DATA_PATH": str(path), "FIGURE_ENCODING": encoding})
+    yield path
+    dashboard.configure({**config, "FIGURE_ENCODING": encoding})
+    dashboard.figure_cache.clear()
+    dashboard.diff_cache.clear()
+
+def test_reload_sends_whole_figures_for_a_stale_rendered_state(reloadable_csv):
+    continents = ["Asia", "Europe"]
+    shown = dashboard.update_figures({"year": 1990, "continents": continents})
+
+    # A new maximum changes every bar chart's axis range.
+    df = pd.read_csv(reloadable_csv)
+    df.loc[(df["Year"] == 1990) & (df["Continent"] == "Asia"), "Mortality Rate"] = 500
+    df.to_csv(reloadable_csv, index=False)
+    os.utime(reloadable_csv, (0, 0))
+    assert dashboard.reload_data() is not None
+
+    delta = dashboard.update_figures({"year": 1991, "continents": continents}, shown["state"])
+    assert "ops" not in delta
+    assert sent(delta["figures"]) == sent(list(dashboard.get_figures(1991, continents)))
+    assert delta["state"]["version"] != shown["state"]["version"]
+
+    # Once the new figures are shown, ticks are deltas again.
+    delta = dashboard.update_figures({"year": 1992, "continents": continents}, delta["state"])
+    assert "figures" not in delta